@@ -1 +1,2 @@
 from . import process_data
+from . import coincidence
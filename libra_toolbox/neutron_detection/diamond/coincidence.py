@@ -0,0 +1,180 @@
+import numpy as np
+from scipy.special import lambertw
+
+
+def find_pileup(time_values: np.ndarray, resolving_time: float) -> np.ndarray:
+    """
+    Finds the events of a detector that are within ``resolving_time`` of
+    another event of the same detector, in a single pass.
+
+    Args:
+        time_values (np.array): the sorted time values of the events (in seconds),
+            eg. ``DataProcessor.get_time_values()``
+        resolving_time (float): the resolving time (in seconds)
+
+    Returns:
+        np.array: boolean mask of the piled-up events
+    """
+    time_values = np.asarray(time_values)
+    close = np.diff(time_values) <= resolving_time
+    pileup = np.zeros(len(time_values), dtype=bool)
+    pileup[:-1] |= close
+    pileup[1:] |= close
+    return pileup
+
+
+def count_coincidences(
+    time_values: np.ndarray, other_time_values: np.ndarray, resolving_time: float
+) -> np.ndarray:
+    """
+    Counts, for each event, the events of another detector within ``resolving_time``.
+
+    Args:
+        time_values (np.array): the sorted time values of the events (in seconds)
+        other_time_values (np.array): the sorted time values of the events of
+            the other detector (in seconds)
+        resolving_time (float): the resolving time (in seconds)
+
+    Returns:
+        np.array: the number of events of the other detector within
+        ``resolving_time`` of each event
+    """
+    time_values = np.asarray(time_values)
+    first = np.searchsorted(other_time_values, time_values - resolving_time, "left")
+    last = np.searchsorted(other_time_values, time_values + resolving_time, "right")
+    return last - first
+
+
+def find_coincidences(time_values: list, resolving_time: float) -> list:
+    """
+    Finds the events of several detectors that are within ``resolving_time``
+    of an event of another detector.
+
+    Args:
+        time_values (list of np.array): the sorted time values of the events of
+            each detector (in seconds)
+        resolving_time (float): the resolving time (in seconds)
+
+    Returns:
+        list of np.array: for each detector, boolean mask of the events in coincidence
+    """
+    coincidences = []
+    for i, detector_time_values in enumerate(time_values):
+        in_coincidence = np.zeros(len(detector_time_values), dtype=bool)
+        for j, other_time_values in enumerate(time_values):
+            if i != j:
+                in_coincidence |= (
+                    count_coincidences(
+                        detector_time_values, other_time_values, resolving_time
+                    )
+                    > 0
+                )
+        coincidences.append(in_coincidence)
+    return coincidences
+
+
+def coincidence_pairs(
+    time_values: np.ndarray, other_time_values: np.ndarray, resolving_time: float
+):
+    """
+    Finds all the pairs of events of two detectors within ``resolving_time``.
+
+    Args:
+        time_values (np.array): the sorted time values of the events of the
+            first detector (in seconds)
+        other_time_values (np.array): the sorted time values of the events of
+            the second detector (in seconds)
+        resolving_time (float): the resolving time (in seconds)
+
+    Returns:
+        np.array: the indices of the events of the first detector
+        np.array: the indices of the events of the second detector
+    """
+    time_values = np.asarray(time_values)
+    first = np.searchsorted(other_time_values, time_values - resolving_time, "left")
+    counts = np.searchsorted(other_time_values, time_values + resolving_time, "right")
+    counts -= first
+
+    indices = np.repeat(np.arange(len(time_values)), counts)
+    # position of each pair among the pairs of its event of the first detector
+    rank = np.arange(len(indices)) - np.repeat(np.cumsum(counts) - counts, counts)
+    other_indices = np.repeat(first, counts) + rank
+    return indices, other_indices
+
+
+def non_paralyzable_correction(count_rates, dead_time: float) -> np.ndarray:
+    r"""
+    Corrects measured count rates for the dead time of a non-paralyzable detector:
+
+    .. math::
+        n = \frac{m}{1 - m \tau}
+
+    Args:
+        count_rates (np.array): the measured count rates (counts per second)
+        dead_time (float): the dead time (in seconds)
+
+    Returns:
+        np.array: the true count rates (counts per second), NaN where the
+        measured rate is above the maximum rate ``1 / dead_time``
+    """
+    count_rates = np.asarray(count_rates, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        true_rates = count_rates / (1 - count_rates * dead_time)
+    return np.where(count_rates * dead_time < 1, true_rates, np.nan)
+
+
+def paralyzable_correction(count_rates, dead_time: float) -> np.ndarray:
+    r"""
+    Corrects measured count rates for the dead time of a paralyzable detector,
+    inverting :math:`m = n \ e^{-n \tau}` on its low rate branch with the
+    Lambert W function:
+
+    .. math::
+        n = - \frac{W_0(- m \tau)}{\tau}
+
+    Args:
+        count_rates (np.array): the measured count rates (counts per second)
+        dead_time (float): the dead time (in seconds)
+
+    Returns:
+        np.array: the true count rates (counts per second), NaN where the
+        measured rate is above the maximum rate ``1 / (e dead_time)``
+    """
+    count_rates = np.asarray(count_rates, dtype=float)
+    if dead_time == 0:
+        return count_rates.copy()
+    x = -count_rates * dead_time
+    valid = x >= -1 / np.e
+    true_rates = -lambertw(np.where(valid, x, 0), 0).real / dead_time
+    return np.where(valid, true_rates, np.nan)
+
+
+DEAD_TIME_CORRECTIONS = {
+    "non-paralyzable": non_paralyzable_correction,
+    "paralyzable": paralyzable_correction,
+}
+
+
+def correct_dead_time(
+    count_rates, dead_time: float, model: str = "non-paralyzable"
+) -> np.ndarray:
+    """
+    Corrects measured count rates for the dead time of a detector.
+
+    Args:
+        count_rates (np.array): the measured count rates (counts per second)
+        dead_time (float): the dead time (in seconds)
+        model (str, optional): "non-paralyzable" or "paralyzable".
+            Defaults to "non-paralyzable".
+
+    Raises:
+        ValueError: if the model is unknown
+
+    Returns:
+        np.array: the true count rates (counts per second)
+    """
+    if model not in DEAD_TIME_CORRECTIONS:
+        raise ValueError(
+            f"Unknown dead time model {model}, must be one of {list(DEAD_TIME_CORRECTIONS)}"
+        )
+    return DEAD_TIME_CORRECTIONS[model](count_rates, dead_time)
@@ -1,21 +1,66 @@
+import hashlib
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
+import pandas as pd
+
+from .coincidence import correct_dead_time
+
+# number of rows parsed at once when streaming a file
+CHUNKSIZE = 1_000_000
+
+# arguments of np.genfromtxt that the streaming reader understands
+STREAMING_KWARGS = ("delimiter", "skip_header", "comments")
+
+# number of bytes read at once from a followed file
+BLOCKSIZE = 64 * 1024**2
 
 
 class DataProcessor:
     """
     A class for reading and processing data from diamond detectors as text files
 
+    Args:
+        cache_dir (str, optional): if provided, the values parsed from each file are
+            cached in this directory and the files are only parsed again if they or the
+            parsing options change. Defaults to None.
+        compact (bool, optional): if True, the time values are stored as int64 picoseconds
+            instead of float64 seconds, which keeps the exact timestamps of long runs, and
+            the energy values as ``energy_dtype``. Times are converted to seconds only
+            on output (rates, bins, ``get_time_values``). Defaults to False.
+        energy_dtype (np.dtype, optional): the type of the energy values in compact mode,
+            eg. ``np.float32`` or ``np.uint16`` for ADC channels. Defaults to np.float32.
+
     Attributes:
         files (list of str): List of text filenames that have been read
-        time_values (np.array): Array of time values from all files
+        time_values (np.array): Array of time values from all files (picoseconds in
+            compact mode, seconds otherwise)
         energy_values (np.array): Array of energy values from all files
+        cache_dir (str): the directory of the parse cache, None if disabled
+        compact (bool): True if the time values are stored in picoseconds
+        time_dtype (np.dtype): the type of the time values
+        energy_dtype (np.dtype): the type of the energy values
     """
 
-    def __init__(self) -> None:
+    def __init__(
+        self, cache_dir: str = None, compact: bool = False, energy_dtype=np.float32
+    ) -> None:
         self.files = []
+        self.cache_dir = cache_dir
+        self.compact = compact
+        self.time_dtype = np.dtype(np.int64 if compact else np.float64)
+        self.energy_dtype = np.dtype(energy_dtype if compact else np.float64)
+        self._sorted_cache = None
+        self._energy_index = None
+        self._spectrum_index = None
+        self._buffers = None
+        self._followed_files = []
+        self._running_count_rates = []
 
-        self.time_values = np.array([])
-        self.energy_values = np.array([])
+        self.time_values = np.array([], dtype=self.time_dtype)
+        self.energy_values = np.array([], dtype=self.energy_dtype)
 
     def add_file(
         self,
@@ -23,41 +68,448 @@ class DataProcessor:
         time_column: int,
         energy_column: int,
         scale_time: bool = True,
+        chunksize: int = CHUNKSIZE,
+        follow: bool = False,
         **kwargs,
     ):
         """
         Adds a file to the data processor, reading the time and energy values from the file
         and appending them to the existing data (``time_values`` and ``energy_values`` attributes).
 
+        The file is streamed in chunks of ``chunksize`` rows with the C parser of pandas,
+        keeping only the time and energy columns, so that the memory needed on top of
+        the values is bounded whatever the size of the file. If ``kwargs`` contains other
+        arguments than ``delimiter``, ``skip_header`` and ``comments``, the file is read
+        with ``np.genfromtxt`` instead.
+
+        The events of the file are sorted (unless they already are) and merged into the
+        existing events, which are kept sorted by time.
+
+        With ``follow=True``, the file can still be written (eg. during an acquisition):
+        only its complete lines are read, and the lines appended afterwards are read
+        by ``update``.
+
         Args:
             filename (str): the name of the file to read
             time_column (int): the column index of the time values in the file
             energy_column (int): the column index of the energy values in the file
             scale_time (bool, optional): if True, the time values are scaled from ps to s. Defaults to True.
+            chunksize (int, optional): the number of rows parsed at once. Defaults to ``CHUNKSIZE``.
+            follow (bool, optional): if True, the file is followed by ``update``. Defaults to False.
+            kwargs: arguments of ``np.genfromtxt`` (eg. ``delimiter``, ``skip_header``)
         """
-        self.files.append(filename)
+        if follow:
+            followed_file = _FollowedFile(
+                filename,
+                time_column,
+                energy_column,
+                scale_time,
+                chunksize,
+                time_dtype=self.time_dtype,
+                energy_dtype=self.energy_dtype,
+                **kwargs,
+            )
+            self.files.append(filename)
+            self._followed_files.append(followed_file)
+            time_values, energy_values = followed_file.read_new_events()
+            self._add_events(time_values, energy_values, spare_capacity=True)
+            print(f"Added file: {filename} containing {len(time_values)} events")
+            return
 
-        # Should we store the data for each file separately too?
-        data = np.genfromtxt(filename, **kwargs)
+        self.add_files(
+            [filename],
+            time_column,
+            energy_column,
+            scale_time=scale_time,
+            chunksize=chunksize,
+            **kwargs,
+        )
 
-        time_values = data[:, time_column]
-        if scale_time:
-            # convert times from ps to s
-            time_values *= 1 / 1e12
-        energy_values = data[:, energy_column]
+    def add_files(
+        self,
+        filenames: list,
+        time_column: int,
+        energy_column: int,
+        scale_time: bool = True,
+        chunksize: int = CHUNKSIZE,
+        workers: int = 1,
+        **kwargs,
+    ):
+        """
+        Adds several files to the data processor (see ``add_file``).
+        The events of each file are sorted on their own, then the files are merged
+        pairwise and merged once into the existing events, instead of after each file.
+
+        The files can be parsed and sorted in parallel by a
+        ``concurrent.futures.ProcessPoolExecutor``, the merge being done in the
+        current process.
+
+        Args:
+            filenames (list of str): the names of the files to read
+            time_column (int): the column index of the time values in the files
+            energy_column (int): the column index of the energy values in the files
+            scale_time (bool, optional): if True, the time values are scaled from ps to s. Defaults to True.
+            chunksize (int, optional): the number of rows parsed at once. Defaults to ``CHUNKSIZE``.
+            workers (int, optional): the number of processes. If 1, the files are read
+                in the current process. If None, ``os.cpu_count()``. Defaults to 1.
+            kwargs: arguments of ``np.genfromtxt`` (eg. ``delimiter``, ``skip_header``)
+        """
+        kwargs = dict(
+            scale_time=scale_time,
+            chunksize=chunksize,
+            time_dtype=self.time_dtype,
+            energy_dtype=self.energy_dtype,
+            **kwargs,
+        )
+        tasks = [
+            (self.cache_dir, filename, time_column, energy_column, kwargs)
+            for filename in filenames
+        ]
+        if workers is None:
+            workers = os.cpu_count()
+        if workers == 1 or len(tasks) <= 1:
+            runs = [_read_sorted_events(task) for task in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+                runs = list(executor.map(_read_sorted_events, tasks))
+
+        for filename, (time_values, _) in zip(filenames, runs):
+            # Should we store the data for each file separately too?
+            self.files.append(filename)
+            print(f"Added file: {filename} containing {len(time_values)} events")
+
+        if not runs:
+            return
+        self._add_events(*_merge_runs(runs))
+
+    def update(self) -> int:
+        """
+        Reads the complete lines appended to the followed files (see ``add_file``)
+        since the last read, merges their events into the existing events and
+        updates the running count rates (see ``track_count_rate``).
+        The cost only depends on the number of new events.
+
+        Returns:
+            int: the number of new events
+        """
+        new_events = [
+            followed_file.read_new_events() for followed_file in self._followed_files
+        ]
+        if not new_events:
+            return 0
+        time_values = np.concatenate([events[0] for events in new_events])
+        energy_values = np.concatenate([events[1] for events in new_events])
+        self._add_events(time_values, energy_values, spare_capacity=True)
+        return len(time_values)
+
+    def track_count_rate(
+        self, bin_time: float, energy_window: tuple = None, t_start: float = None
+    ) -> "RunningCountRate":
+        """
+        Starts a count rate histogram that is updated with the events added
+        afterwards (by ``update``, ``add_file`` or ``add_files``).
+
+        Args:
+            bin_time (float): the time bin width in seconds
+            energy_window (tuple, optional): If provided, the rate
+                will be computed only on this energy window. Defaults to None.
+            t_start (float, optional): the start of the first time bin (in seconds).
+                Defaults to the first time value (0 if there are no events).
+
+        Returns:
+            RunningCountRate: the running count rate, with the existing events
+        """
+        time_values, energy_values = self._sorted_events()
+        if t_start is None:
+            t_start = self._in_seconds(time_values[0]) if len(time_values) > 0 else 0.0
+        count_rate = RunningCountRate(bin_time, energy_window, t_start)
+        count_rate.add_events(self._in_seconds(time_values), energy_values)
+        self._running_count_rates.append(count_rate)
+        return count_rate
+
+    def _add_events(
+        self,
+        time_values: np.ndarray,
+        energy_values: np.ndarray,
+        spare_capacity: bool = False,
+    ):
+        """
+        Sorts new events, merges them into the existing events and adds them
+        to the running count rates.
+
+        Args:
+            time_values (np.array): the time values of the new events
+            energy_values (np.array): the energy values of the new events
+            spare_capacity (bool, optional): if True, the events are stored with spare
+                capacity, so that events appended later are not copied again.
+                Defaults to False.
+        """
+        time_values, energy_values = _sort_events(time_values, energy_values)
+        self._merge_events(time_values, energy_values, spare_capacity)
+        for count_rate in self._running_count_rates:
+            count_rate.add_events(self._in_seconds(time_values), energy_values)
+
+    def save(self, path: str):
+        """
+        Saves the events sorted by time and the names of the files to a
+        directory, as ``.npy`` files that ``load`` can memory-map.
+
+        Args:
+            path (str): the directory, created if it does not exist
+        """
+        os.makedirs(path, exist_ok=True)
+        time_values, energy_values = self._sorted_events()
+        np.save(os.path.join(path, "time_values.npy"), time_values)
+        np.save(os.path.join(path, "energy_values.npy"), energy_values)
+        with open(os.path.join(path, "files.json"), "w") as f:
+            json.dump(
+                {
+                    "files": [str(filename) for filename in self.files],
+                    "compact": self.compact,
+                    "energy_dtype": self.energy_dtype.str,
+                    "sorted": True,
+                },
+                f,
+            )
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True, **kwargs) -> "DataProcessor":
+        """
+        Loads a data processor saved with ``save``.
+
+        Args:
+            path (str): the directory of the saved data processor
+            mmap (bool, optional): if True, the events are memory-mapped (read-only),
+                so that only the parts that are used are read from disk. Defaults to True.
+            kwargs: arguments of ``DataProcessor``, by default those of the
+                saved data processor
+
+        Returns:
+            DataProcessor: the data processor
+        """
+        with open(os.path.join(path, "files.json")) as f:
+            metadata = json.load(f)
+        kwargs.setdefault("compact", metadata.get("compact", False))
+        kwargs.setdefault("energy_dtype", metadata.get("energy_dtype", np.float32))
+
+        mmap_mode = "r" if mmap else None
+        processor = cls(**kwargs)
+        processor.time_values = np.load(
+            os.path.join(path, "time_values.npy"), mmap_mode=mmap_mode
+        )
+        processor.energy_values = np.load(
+            os.path.join(path, "energy_values.npy"), mmap_mode=mmap_mode
+        )
+        processor.files = metadata["files"]
+        if metadata.get("sorted", False):
+            # the saved events are sorted, so they are not read to check it
+            processor._sorted_cache = (
+                processor.time_values,
+                processor.energy_values,
+                processor.time_values,
+                processor.energy_values,
+            )
+        return processor
+
+    def _merge_events(
+        self,
+        time_values: np.ndarray,
+        energy_values: np.ndarray,
+        spare_capacity: bool = False,
+    ):
+        """
+        Merges events sorted by time into ``time_values`` and ``energy_values``,
+        in linear time. Events that are all after the existing events are appended,
+        in place if there is spare capacity.
+
+        Args:
+            time_values (np.array): the sorted time values of the new events
+            energy_values (np.array): the energy values of the new events
+            spare_capacity (bool, optional): if True, the events are stored with spare
+                capacity for later appends. Defaults to False.
+        """
+        # the existing values may have been set directly
+        old_time_values, old_energy_values = self._sorted_events()
+
+        if (
+            len(old_time_values) == 0
+            or len(time_values) == 0
+            or time_values[0] >= old_time_values[-1]
+        ):
+            self._append_events(
+                old_time_values,
+                old_energy_values,
+                time_values,
+                energy_values,
+                spare_capacity,
+            )
+            return
+
+        merged = _merge_two_runs(
+            (old_time_values, old_energy_values), (time_values, energy_values)
+        )
+        self.time_values, self.energy_values = merged
+        self._sorted_cache = (*merged, *merged)
+
+    def _append_events(
+        self,
+        old_time_values,
+        old_energy_values,
+        time_values,
+        energy_values,
+        spare_capacity,
+    ):
+        """
+        Appends events after the existing sorted events. The events are views on
+        buffers that can keep spare capacity, so that successive appends cost
+        (amortised) the number of new events only. Appending after the end of the
+        views does not modify the views returned previously.
+        """
+        n_old, n_new = len(old_time_values), len(time_values)
+        n_events = n_old + n_new
+        dtypes = [
+            np.result_type(old_time_values, time_values),
+            np.result_type(old_energy_values, energy_values),
+        ]
+        buffers = self._buffers
+        in_place = (
+            buffers is not None
+            and buffers[2] is self.time_values
+            and buffers[3] is self.energy_values
+            and len(buffers[0]) >= n_events
+            and [buffers[0].dtype, buffers[1].dtype] == dtypes
+        )
+        if not in_place:
+            capacity = int(1.5 * n_events) if spare_capacity else n_events
+            buffers = [np.empty(capacity, dtype=dtype) for dtype in dtypes]
+            buffers[0][:n_old] = old_time_values
+            buffers[1][:n_old] = old_energy_values
+        buffers[0][n_old:n_events] = time_values
+        buffers[1][n_old:n_events] = energy_values
+
+        self.time_values = buffers[0][:n_events]
+        self.energy_values = buffers[1][:n_events]
+        self._buffers = (buffers[0], buffers[1], self.time_values, self.energy_values)
+        self._sorted_cache = (self.time_values, self.energy_values) * 2
+
+    def get_time_values(self) -> np.ndarray:
+        """
+        Returns the time values in seconds, whether they are stored in
+        picoseconds (compact mode) or in seconds.
+
+        Returns:
+            np.array: Array of time values (in seconds)
+        """
+        return self._in_seconds(np.asarray(self.time_values))
+
+    def _in_seconds(self, time_values):
+        """Converts time values to seconds (from picoseconds in compact mode)"""
+        if self.compact:
+            return np.asarray(time_values) * 1e-12
+        return np.asarray(time_values)
 
-        # Append time and energy values to the list
-        self.time_values = np.concatenate((self.time_values, time_values))
-        self.energy_values = np.concatenate((self.energy_values, energy_values))
+    def _search_times(self, time_values: np.ndarray, times, side: str):
+        """
+        ``np.searchsorted`` of times in seconds in the sorted time values,
+        which are integer picoseconds in compact mode.
+        """
+        if self.compact:
+            times = np.asarray(times, dtype=float) * 1e12
+            # for an integer t, t < x is t < ceil(x) and t <= x is t <= floor(x)
+            times = np.ceil(times) if side == "left" else np.floor(times)
+            times = np.clip(times, -(2**62), 2**62).astype(time_values.dtype)
+        return np.searchsorted(time_values, times, side=side)
+
+    def _sorted_events(self):
+        """
+        Returns ``time_values`` and ``energy_values`` sorted by time. They are
+        only checked (and sorted if needed) when the arrays are replaced.
 
-        # sort time and energy values
-        inds = np.argsort(self.time_values)
-        self.time_values = np.array(self.time_values)[inds]
-        self.energy_values = np.array(self.energy_values)[inds]
+        Returns:
+            np.array: the sorted time values
+            np.array: the energy values in the same order
+        """
+        cache = self._sorted_cache
+        if (
+            cache is None
+            or cache[0] is not self.time_values
+            or cache[1] is not self.energy_values
+        ):
+            sorted_values = _sort_events(
+                np.asarray(self.time_values), np.asarray(self.energy_values)
+            )
+            cache = (self.time_values, self.energy_values, *sorted_values)
+            self._sorted_cache = cache
+        return cache[2], cache[3]
+
+    def build_energy_index(self, energy_windows: list):
+        """
+        Precomputes the cumulative number of events in energy windows. The rates in
+        these windows (and in all energies) are then computed by binary search on the
+        sorted times only, in O(log n) per time window or bin.
+        The index takes 4 bytes (8 above 2**32 events) per event and window, and
+        is discarded when the events change.
+
+        Args:
+            energy_windows (list of tuple): the energy windows to index
+        """
+        time_values, energy_values = self._sorted_events()
+        index = self._get_energy_index()
+        dtype = np.uint32 if len(time_values) < 2**32 else np.int64
+        for window in energy_windows:
+            if window is None or tuple(window) in index:
+                continue
+            in_window = (energy_values > window[0]) & (energy_values < window[1])
+            cumulative = np.zeros(len(time_values) + 1, dtype=dtype)
+            np.cumsum(in_window, out=cumulative[1:])
+            index[tuple(window)] = cumulative
+
+    def _get_energy_index(self) -> dict:
+        """
+        Returns the energy index of the current events (see ``build_energy_index``),
+        a dict of the cumulative counts of each indexed energy window.
+        """
+        time_values, _ = self._sorted_events()
+        if self._energy_index is None or self._energy_index[0] is not time_values:
+            self._energy_index = (time_values, {})
+        return self._energy_index[1]
+
+    def _counts_before(self, positions: np.ndarray, energy_windows: list):
+        """
+        Counts the events between the first and each of given positions in energy
+        windows, from the energy index if all the windows are indexed, in a single
+        pass over the events between the first and last positions otherwise.
+
+        Args:
+            positions (np.array): sorted indices in the sorted events
+            energy_windows (list of tuple): the energy windows, None meaning all energies
+
+        Returns:
+            np.array: the number of events with an index between the first position
+            (included) and each position (excluded), in each energy window, with shape
+            ``(len(energy_windows), len(positions))``
+        """
+        index = self._get_energy_index()
+        if all(window is None or tuple(window) in index for window in energy_windows):
+            counts = np.empty((len(energy_windows), len(positions)), dtype=np.int64)
+            for i, window in enumerate(energy_windows):
+                counts[i] = (
+                    positions if window is None else index[tuple(window)][positions]
+                )
+            if len(positions) > 0:
+                counts -= counts[:, :1]
+            return counts
 
-        print(f"Added file: {filename} containing {len(time_values)} events")
+        _, energy_values = self._sorted_events()
+        return _cumulative_counts(energy_values, positions, energy_windows)
 
-    def get_count_rate(self, bin_time: float, energy_window: tuple = None):
+    def get_count_rate(
+        self,
+        bin_time: float,
+        energy_window: tuple = None,
+        dead_time: float = None,
+        dead_time_model: str = "non-paralyzable",
+    ):
         """
         Calculate the count rate in a given time bin for the
         time values stored in the data processor.
@@ -66,26 +518,89 @@ class DataProcessor:
             bin_time (float): the time bin width in seconds
             energy_window (tuple, optional): If provided, the rate
                 will be computed only on this energy window. Defaults to None.
+            dead_time (float, optional): If provided, the dead time of the
+                detector (in seconds) and the rate is corrected for it
+                (see ``get_count_rates``). Defaults to None.
+            dead_time_model (str, optional): "non-paralyzable" or "paralyzable".
+                Defaults to "non-paralyzable".
 
         Returns:
             np.array: Array of count rates (counts per second)
             np.array: Array of time bin edges (in seconds)
         """
-        time_values = self.time_values.copy()
-        energy_values = self.energy_values.copy()
+        count_rates, _, count_rate_bins = self.get_count_rates(
+            bin_time,
+            energy_windows=[energy_window],
+            dead_time=dead_time,
+            dead_time_model=dead_time_model,
+        )
+        return count_rates[0], count_rate_bins
 
-        time_bins = np.arange(time_values.min(), time_values[-2], bin_time)
+    def get_count_rates(
+        self,
+        bin_time: float,
+        energy_windows: list = None,
+        dead_time: float = None,
+        dead_time_model: str = "non-paralyzable",
+    ):
+        """
+        Calculate the count rates in given time bins for several energy windows
+        at once. The time bins are found by binary search in the sorted times and
+        the energy windows are counted in a single pass over the events, unless
+        they are indexed (see ``build_energy_index``).
 
-        if energy_window is not None:
-            peak_mask = (energy_values > energy_window[0]) & (
-                energy_values < energy_window[1]
-            )
-            time_values = time_values[peak_mask]
+        If ``dead_time`` is provided, the dead time correction of the total
+        count rate of each bin (all energies) is computed with
+        ``coincidence.correct_dead_time`` and the rates and errors of all the
+        energy windows are scaled by the same factor, since the detector is dead
+        for events of any energy.
+
+        Args:
+            bin_time (float): the time bin width in seconds
+            energy_windows (list of tuple, optional): the energy windows, None
+                meaning all energies. Defaults to None (all energies only).
+            dead_time (float, optional): the dead time of the detector (in seconds).
+                Defaults to None (no correction).
+            dead_time_model (str, optional): "non-paralyzable" or "paralyzable".
+                Defaults to "non-paralyzable".
 
-        count_rates, count_rate_bins = np.histogram(time_values, bins=time_bins)
-        count_rates = count_rates / bin_time
+        Returns:
+            np.array: Array of count rates (counts per second) with shape
+            ``(len(energy_windows), n_bins)``
+            np.array: Array of the Poisson errors on the count rates (counts per second)
+            np.array: Array of time bin edges (in seconds)
+        """
+        if energy_windows is None:
+            energy_windows = [None]
+        time_values, _ = self._sorted_events()
 
-        return count_rates, count_rate_bins
+        time_bins = np.arange(
+            self._in_seconds(time_values[0]),
+            self._in_seconds(time_values[-2]),
+            bin_time,
+        )
+
+        # same bins as np.histogram: [left, right) except the last one [left, right]
+        positions = self._search_times(time_values, time_bins, side="left")
+        positions[-1] = self._search_times(time_values, time_bins[-1], side="right")
+        counts = np.diff(self._counts_before(positions, energy_windows), axis=-1)
+
+        count_rates = counts / bin_time
+        count_rate_errors = np.sqrt(counts) / bin_time
+
+        if dead_time is not None:
+            total_rates = np.diff(positions) / bin_time
+            corrected_rates = correct_dead_time(
+                total_rates, dead_time, model=dead_time_model
+            )
+            with np.errstate(divide="ignore", invalid="ignore"):
+                correction = np.where(
+                    total_rates > 0, corrected_rates / total_rates, 1.0
+                )
+            count_rates = count_rates * correction
+            count_rate_errors = count_rate_errors * correction
+
+        return count_rates, count_rate_errors, time_bins
 
     def get_avg_rate(self, t_min: float, t_max: float, energy_window: tuple = None):
         """
@@ -103,25 +618,693 @@ class DataProcessor:
             float: Average count rate (counts per second)
             float: Error on the average count rate (counts per second)
         """
-        time_values = self.time_values.copy()
-        energy_values = self.energy_values.copy()
+        count_rates, count_rate_errors = self.get_avg_rates(
+            [(t_min, t_max)], energy_windows=[energy_window]
+        )
+        return count_rates[0, 0], count_rate_errors[0, 0]
+
+    def get_avg_rates(self, time_windows: list, energy_windows: list = None):
+        """
+        Calculate the average count rates in several time windows and energy
+        windows at once. The time windows are found by binary search in the sorted
+        times, so that only the energy windows that are not indexed (see
+        ``build_energy_index``) need a (single) pass over the events.
+
+        Args:
+            time_windows (list of tuple): the time windows ``(t_min, t_max)``
+            energy_windows (list of tuple, optional): the energy windows, None
+                meaning all energies. Defaults to None (all energies only).
+
+        Returns:
+            np.array: Array of average count rates (counts per second) with shape
+            ``(len(time_windows), len(energy_windows))``
+            np.array: Array of the errors on the average count rates (counts per second)
+        """
+        if energy_windows is None:
+            energy_windows = [None]
+        time_values, _ = self._sorted_events()
+
+        t_min, t_max = np.asarray(time_windows, dtype=float).reshape(-1, 2).T
 
-        if energy_window is not None:
-            peak_mask = (energy_values > energy_window[0]) & (
-                energy_values < energy_window[1]
+        # only count pulses strictly inside the time windows
+        starts = self._search_times(time_values, t_min, side="right")
+        stops = np.maximum(self._search_times(time_values, t_max, side="left"), starts)
+        positions, inverse = np.unique(
+            np.concatenate((starts, stops)), return_inverse=True
+        )
+        cumulative = self._counts_before(positions, energy_windows)
+        counts = (
+            cumulative[:, inverse[len(starts) :]]
+            - cumulative[:, inverse[: len(starts)]]
+        )
+        counts = counts.T
+
+        delta_t = (t_max - t_min)[:, None]
+        count_rates = counts / delta_t
+        count_rate_errors = np.sqrt(counts) / delta_t
+
+        return count_rates, count_rate_errors
+
+    def get_time_energy_histogram(self, time_bins, energy_bins):
+        """
+        Calculate the 2D histogram of the events in time and energy,
+        in a single pass over the events.
+
+        Args:
+            time_bins (int or np.array): the number of time bins or the time bin edges
+                (in seconds)
+            energy_bins (int or np.array): the number of energy bins or the energy bin edges
+
+        Returns:
+            np.array: Array of counts with shape ``(n_time_bins, n_energy_bins)``
+            np.array: Array of time bin edges (in seconds)
+            np.array: Array of energy bin edges
+        """
+        time_values, energy_values = self._sorted_events()
+        # the time values are sorted, the first and last ones give the range
+        time_range = self._in_seconds(time_values[[0, -1]] if len(time_values) else [])
+        time_bins = np.histogram_bin_edges(time_range, time_bins)
+        energy_bins = np.histogram_bin_edges(energy_values, energy_bins)
+
+        # same bins as np.histogram: [left, right) except the last one [left, right]
+        positions = self._search_times(time_values, time_bins, side="left")
+        positions[-1] = self._search_times(time_values, time_bins[-1], side="right")
+        cumulative = _cumulative_histogram(energy_values, energy_bins, positions)
+
+        return np.diff(cumulative, axis=0), time_bins, energy_bins
+
+    def build_spectrum_index(self, energy_bins, time_step: float):
+        """
+        Precomputes the cumulative energy histogram of the events every ``time_step``.
+        The spectrum of any time window (see ``get_energy_spectrum``) with the same
+        ``energy_bins`` is then the difference of two cumulative histograms, plus
+        the events of less than ``time_step`` at both ends of the window.
+        The index is discarded when the events change.
+
+        Args:
+            energy_bins (int or np.array): the number of energy bins or the energy bin edges
+            time_step (float): the time between two cumulative histograms (in seconds)
+        """
+        time_values, energy_values = self._sorted_events()
+        edges = np.histogram_bin_edges(energy_values, energy_bins)
+        t_first, t_last = self._in_seconds(time_values[[0, -1]])
+        checkpoints = np.arange(t_first, t_last + time_step, time_step)
+        positions = np.unique(self._search_times(time_values, checkpoints, side="left"))
+        cumulative = _cumulative_histogram(energy_values, edges, positions)
+        self._spectrum_index = (time_values, energy_bins, edges, positions, cumulative)
+
+    def get_energy_spectrum(self, bins, time_window: tuple = None):
+        """
+        Calculate the energy spectrum of the events, optionally in a time window.
+        If a spectrum index with the same bins has been built (see
+        ``build_spectrum_index``), the spectrum is computed from it.
+
+        Args:
+            bins (int or np.array): the number of energy bins or the energy bin edges.
+                The edges are computed on all the events, so that the spectra of
+                different time windows have the same bins.
+            time_window (tuple, optional): If provided, only the events strictly
+                between ``t_min`` and ``t_max`` are counted. Defaults to None.
+
+        Returns:
+            np.array: Array of counts in each energy bin
+            np.array: Array of energy bin edges
+        """
+        time_values, energy_values = self._sorted_events()
+
+        index = self._spectrum_index
+        indexed = (
+            index is not None
+            and index[0] is time_values
+            and (np.array_equal(bins, index[1]) or np.array_equal(bins, index[2]))
+        )
+        if indexed:
+            _, _, bins, positions, cumulative = index
+        else:
+            bins = np.histogram_bin_edges(energy_values, bins)
+
+        start, stop = 0, len(time_values)
+        if time_window is not None:
+            start = self._search_times(time_values, time_window[0], side="right")
+            stop = max(
+                self._search_times(time_values, time_window[1], side="left"), start
+            )
+
+        def histogram(first, last):
+            return _cumulative_histogram(
+                energy_values[first:last], bins, [last - first]
+            )[0]
+
+        if indexed:
+            # the indexed positions inside the window
+            first = np.searchsorted(positions, start, side="left")
+            last = np.searchsorted(positions, stop, side="right") - 1
+            if first <= last:
+                counts = cumulative[last] - cumulative[first]
+                counts += histogram(start, positions[first])
+                counts += histogram(positions[last], stop)
+                return counts, bins
+
+        return histogram(start, stop), bins
+
+
+class RunningCountRate:
+    """
+    A count rate histogram updated incrementally with new events,
+    see ``DataProcessor.track_count_rate``.
+    The time bins are ``[t_start + i * bin_time, t_start + (i + 1) * bin_time)``
+    and extend as events arrive.
+
+    Args:
+        bin_time (float): the time bin width in seconds
+        energy_window (tuple, optional): If provided, only the events strictly
+            inside this energy window are counted. Defaults to None.
+        t_start (float, optional): the start of the first time bin (in seconds). Defaults to 0.
+
+    Attributes:
+        counts (np.array): the number of counts in each time bin
+    """
+
+    def __init__(
+        self, bin_time: float, energy_window: tuple = None, t_start: float = 0.0
+    ):
+        self.bin_time = bin_time
+        self.energy_window = energy_window
+        self.t_start = t_start
+        self.counts = np.zeros(0, dtype=np.int64)
+
+    @property
+    def bins(self) -> np.ndarray:
+        """Array of time bin edges (in seconds)"""
+        return self.t_start + np.arange(len(self.counts) + 1) * self.bin_time
+
+    @property
+    def count_rates(self) -> np.ndarray:
+        """Array of count rates (counts per second)"""
+        return self.counts / self.bin_time
+
+    @property
+    def count_rate_errors(self) -> np.ndarray:
+        """Array of the Poisson errors on the count rates (counts per second)"""
+        return np.sqrt(self.counts) / self.bin_time
+
+    def add_events(self, time_values: np.ndarray, energy_values: np.ndarray):
+        """
+        Adds events to the histogram, in any order.
+
+        Args:
+            time_values (np.array): the time values of the events (in seconds)
+            energy_values (np.array): the energy values of the events
+        """
+        if self.energy_window is not None:
+            peak_mask = (energy_values > self.energy_window[0]) & (
+                energy_values < self.energy_window[1]
             )
             time_values = time_values[peak_mask]
+        bin_index = np.floor((time_values - self.t_start) / self.bin_time)
+        bin_index = bin_index[bin_index >= 0].astype(np.int64)
+        if len(bin_index) == 0:
+            return
+        counts = np.bincount(bin_index, minlength=len(self.counts))
+        counts[: len(self.counts)] += self.counts
+        self.counts = counts
+
+
+class _FollowedFile:
+    """
+    A file that is still being written, read from the end of the last
+    complete line read (see ``DataProcessor.add_file``).
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        time_column: int,
+        energy_column: int,
+        scale_time: bool = True,
+        chunksize: int = CHUNKSIZE,
+        time_dtype=np.float64,
+        energy_dtype=np.float64,
+        delimiter: str = None,
+        skip_header: int = 0,
+        comments: str = "#",
+        **kwargs,
+    ):
+        if kwargs or min(time_column, energy_column) < 0:
+            raise ValueError(
+                f"Followed files only support the arguments {STREAMING_KWARGS} "
+                "and non-negative column indices"
+            )
+        self.filename = filename
+        self.columns = [time_column, energy_column]
+        self.scale_time = scale_time
+        self.chunksize = chunksize
+        self.time_dtype = time_dtype
+        self.energy_dtype = energy_dtype
+        self.delimiter = delimiter
+        self.comments = comments
+        self.header_lines = skip_header
+        self.offset = 0
+
+    def read_new_events(self, blocksize: int = BLOCKSIZE):
+        """
+        Reads the complete lines written since the last read.
+
+        Args:
+            blocksize (int, optional): the number of bytes read at once. Defaults to ``BLOCKSIZE``.
+
+        Returns:
+            np.array: the time values of the new events, in the order of the file
+            np.array: the energy values of the new events, in the order of the file
+        """
+        dtypes = _parsed_dtypes(self.scale_time, self.time_dtype, self.energy_dtype)
+        chunks = [[np.empty(0, dtype) for dtype in dtypes]]
+        with open(self.filename, "rb") as f:
+            f.seek(self.offset)
+            while self.header_lines > 0:
+                line = f.readline()
+                if not line.endswith(b"\n"):
+                    # the header is not complete yet
+                    break
+                self.header_lines -= 1
+                self.offset = f.tell()
+
+            incomplete_line = b""
+            while True:
+                block = f.read(blocksize)
+                if not block:
+                    break
+                data = incomplete_line + block
+                end = data.rfind(b"\n") + 1
+                incomplete_line = data[end:]
+                if end == 0:
+                    continue
+                chunks.append(
+                    read_columns(
+                        io.BytesIO(data[:end]),
+                        self.columns,
+                        dtypes=dtypes,
+                        delimiter=self.delimiter,
+                        comments=self.comments,
+                        chunksize=self.chunksize,
+                    )
+                )
+                self.offset += end
+
+        time_values = np.concatenate([chunk[0] for chunk in chunks])
+        energy_values = np.concatenate([chunk[1] for chunk in chunks])
+        time_values = _convert_times(time_values, self.scale_time, self.time_dtype)
+        return time_values, energy_values
+
+
+def read_events(
+    filename: str,
+    time_column: int,
+    energy_column: int,
+    scale_time: bool = True,
+    chunksize: int = CHUNKSIZE,
+    time_dtype=np.float64,
+    energy_dtype=np.float64,
+    **kwargs,
+):
+    """
+    Reads the time and energy values of a file (see ``DataProcessor.add_file``).
+
+    Args:
+        filename (str): the name of the file to read
+        time_column (int): the column index of the time values in the file
+        energy_column (int): the column index of the energy values in the file
+        scale_time (bool, optional): if True, the time values are scaled from ps to s. Defaults to True.
+        chunksize (int, optional): the number of rows parsed at once. Defaults to ``CHUNKSIZE``.
+        time_dtype (np.dtype, optional): the type of the returned time values. If it is
+            an integer type, the times are returned in picoseconds (and parsed as integers
+            if ``scale_time`` is True, without rounding). Defaults to np.float64.
+        energy_dtype (np.dtype, optional): the type of the returned energy values.
+            Defaults to np.float64.
+        kwargs: arguments of ``np.genfromtxt`` (eg. ``delimiter``, ``skip_header``)
+
+    Returns:
+        np.array: the time values, in the order of the file
+        np.array: the energy values, in the order of the file
+    """
+    columns = [time_column, energy_column]
+    if set(kwargs) <= set(STREAMING_KWARGS) and min(columns) >= 0:
+        dtypes = _parsed_dtypes(scale_time, time_dtype, energy_dtype)
+        time_values, energy_values = read_columns(
+            filename, columns, dtypes=dtypes, chunksize=chunksize, **kwargs
+        )
+    else:
+        data = np.genfromtxt(filename, **kwargs)
+        time_values = data[:, time_column]
+        energy_values = data[:, energy_column].astype(energy_dtype, copy=False)
+
+    time_values = _convert_times(time_values, scale_time, time_dtype)
+    return time_values, energy_values
+
+
+def _read_cached_events(cache_dir: str, filename: str, *args, **kwargs):
+    """
+    Reads the events of a file with ``read_events``, through the parse
+    cache in ``cache_dir`` if it is not None (see ``DataProcessor``).
+    """
+    if cache_dir is None:
+        return read_events(filename, *args, **kwargs)
+
+    chunksize = kwargs.pop("chunksize", CHUNKSIZE)  # does not change the values
+    key = _cache_key(filename, args, kwargs)
+    paths = [
+        os.path.join(cache_dir, f"{key}_{name}.npy")
+        for name in ("time_values", "energy_values")
+    ]
+    if all(os.path.exists(path) for path in paths):
+        return tuple(np.load(path) for path in paths)
+
+    values = read_events(filename, *args, chunksize=chunksize, **kwargs)
+    os.makedirs(cache_dir, exist_ok=True)
+    for path, array in zip(paths, values):
+        # written under a temporary name so that a cache entry is never partial
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, array)
+        os.replace(tmp_path, path)
+    return values
+
+
+def _read_sorted_events(task: tuple):
+    """
+    Reads the events of a file and sorts them by time, in a worker of
+    ``DataProcessor.add_files``.
+
+    Args:
+        task (tuple): the cache directory, the name of the file, the time and
+            energy columns and the other arguments of ``read_events``
+
+    Returns:
+        np.array: the sorted time values
+        np.array: the energy values in the same order
+    """
+    cache_dir, filename, time_column, energy_column, kwargs = task
+    time_values, energy_values = _read_cached_events(
+        cache_dir, filename, time_column, energy_column, **kwargs
+    )
+    return _sort_events(time_values, energy_values)
+
+
+def _merge_two_runs(run: tuple, other_run: tuple):
+    """
+    Merges two runs of events sorted by time, in linear time. The events of
+    ``other_run`` go after the events of ``run`` with the same time.
+
+    Args:
+        run (tuple): the sorted time values and the energy values of the first run
+        other_run (tuple): the sorted time values and the energy values of the second run
+
+    Returns:
+        np.array: the merged time values
+        np.array: the merged energy values
+    """
+    positions = np.searchsorted(run[0], other_run[0], side="right")
+    positions += np.arange(len(other_run[0]))
+    is_new = np.zeros(len(run[0]) + len(other_run[0]), dtype=bool)
+    is_new[positions] = True
+
+    merged = []
+    for old, new in zip(run, other_run):
+        values = np.empty(len(is_new), dtype=np.result_type(old, new))
+        values[positions] = new
+        values[~is_new] = old
+        merged.append(values)
+    return tuple(merged)
+
+
+def _merge_runs(runs: list):
+    """
+    Merges runs of events sorted by time, pairwise in ``log2(len(runs))`` passes.
+
+    Args:
+        runs (list of tuple): the sorted time values and the energy values of each run
+
+    Returns:
+        np.array: the merged time values
+        np.array: the merged energy values
+    """
+    while len(runs) > 1:
+        runs = [
+            _merge_two_runs(*runs[i : i + 2]) if i + 1 < len(runs) else runs[i]
+            for i in range(0, len(runs), 2)
+        ]
+    return runs[0]
+
+
+def _parsed_dtypes(scale_time: bool, time_dtype, energy_dtype) -> list:
+    """
+    Returns the types in which the time and energy columns are parsed:
+    integer picoseconds are parsed as integers, seconds as floats.
+    """
+    if np.issubdtype(time_dtype, np.integer) and scale_time:
+        return [time_dtype, energy_dtype]
+    return [np.float64, energy_dtype]
+
+
+def _convert_times(time_values: np.ndarray, scale_time: bool, time_dtype):
+    """
+    Converts parsed time values to ``time_dtype``, in picoseconds for integer
+    types and in seconds otherwise.
+    """
+    if np.issubdtype(time_dtype, np.integer):
+        if not scale_time:
+            # convert times from s to ps
+            time_values = np.round(time_values * 1e12)
+        return time_values.astype(time_dtype, copy=False)
+
+    if scale_time:
+        # convert times from ps to s
+        time_values *= 1 / 1e12
+    return time_values.astype(time_dtype, copy=False)
+
+
+def read_columns(
+    filename: str,
+    columns: list,
+    dtypes: list = None,
+    delimiter: str = None,
+    skip_header: int = 0,
+    comments: str = "#",
+    chunksize: int = CHUNKSIZE,
+) -> np.ndarray:
+    """
+    Reads some columns of a text file in chunks with the C parser of pandas.
+    The other columns are skipped by the parser and never converted.
+
+    Args:
+        filename (str): the name of the file to read
+        columns (list of int): the indices of the columns to read
+        dtypes (list of np.dtype, optional): the type of each column. Integer columns are
+            parsed as integers, the others as floats. Defaults to np.float64 for all columns.
+        delimiter (str, optional): the string separating the columns. If None,
+            any whitespace separates the columns (as ``np.genfromtxt``). Defaults to None.
+        skip_header (int, optional): the number of lines to skip at the beginning
+            of the file. Defaults to 0.
+        comments (str, optional): the character starting a comment. Defaults to "#".
+        chunksize (int, optional): the number of rows parsed at once. Defaults to ``CHUNKSIZE``.
+
+    Returns:
+        list of np.ndarray: the values of each column
+    """
+    if dtypes is None:
+        dtypes = [np.float64] * len(columns)
+    parsed_dtypes = {
+        column: np.int64 if np.issubdtype(dtype, np.integer) else np.float64
+        for column, dtype in zip(columns, dtypes)
+    }
+    usecols = sorted(set(columns))
+    empty = [np.empty(0, dtype=dtype) for dtype in dtypes]
+    try:
+        reader = pd.read_csv(
+            filename,
+            sep=r"\s+" if delimiter is None else delimiter,
+            header=None,
+            usecols=usecols,
+            skiprows=skip_header,
+            comment=comments,
+            dtype=parsed_dtypes,
+            float_precision="round_trip",
+            engine="c",
+            chunksize=chunksize,
+        )
+    except pd.errors.EmptyDataError:
+        return empty
+    with reader:
+        chunks = [
+            [chunk[column].to_numpy(dtype) for column, dtype in zip(columns, dtypes)]
+            for chunk in reader
+        ]
+
+    return [
+        np.concatenate([values] + [chunk[i] for chunk in chunks])
+        for i, values in enumerate(empty)
+    ]
+
+
+def _cache_key(filename: str, args: tuple, kwargs: dict) -> str:
+    """
+    Returns the key of the parse cache for a file, from its absolute path,
+    modification time and size and the parsing options.
+    """
+    stat = os.stat(filename)
+    description = repr(
+        (
+            os.path.abspath(filename),
+            stat.st_mtime_ns,
+            stat.st_size,
+            args,
+            sorted(kwargs.items()),
+        )
+    )
+    return hashlib.sha1(description.encode()).hexdigest()
+
+
+def _sort_events(time_values: np.ndarray, energy_values: np.ndarray):
+    """
+    Sorts events by time, unless they already are. The sort is stable, which
+    makes it fast on concatenations of sorted files.
+
+    Args:
+        time_values (np.array): the time values
+        energy_values (np.array): the energy values
+
+    Returns:
+        np.array: the sorted time values
+        np.array: the energy values in the same order
+    """
+    if np.all(time_values[1:] >= time_values[:-1]):
+        return time_values, energy_values
+    inds = np.argsort(time_values, kind="stable")
+    if len(energy_values) == 0:
+        # only the time values have been set
+        return time_values[inds], energy_values
+    return time_values[inds], energy_values[inds]
+
+
+def _cumulative_histogram(
+    energy_values: np.ndarray,
+    bins: np.ndarray,
+    positions: np.ndarray,
+    chunksize: int = CHUNKSIZE,
+) -> np.ndarray:
+    """
+    Calculates the energy histograms of the events before given positions,
+    in a single pass over the events, ``chunksize`` events at a time.
+
+    Args:
+        energy_values (np.array): the energy values of the events
+        bins (np.array): the energy bin edges, with the same convention as ``np.histogram``
+        positions (np.array): sorted indices in the events
+        chunksize (int, optional): the number of events processed at once.
+            Defaults to CHUNKSIZE.
+
+    Returns:
+        np.array: the histogram of the events with an index lower than each position,
+        with shape ``(len(positions), len(bins) - 1)``
+    """
+    positions = np.asarray(positions, dtype=np.intp)
+    n_bins = len(bins) - 1
+
+    # histogram of the events between the previous position and each position,
+    # events out of the bins go to an extra bin
+    counts = np.zeros((len(positions), n_bins + 1), dtype=np.int64)
+    if len(positions) > 0:
+        for start in range(0, positions[-1], chunksize):
+            stop = min(start + chunksize, positions[-1])
+            energies = energy_values[start:stop]
+
+            # same bins as np.histogram
+            bin_index = np.searchsorted(bins, energies, side="right") - 1
+            bin_index[energies == bins[-1]] = n_bins - 1
+            bin_index[(bin_index < 0) | (bin_index >= n_bins)] = n_bins
+
+            # the events of the chunk belong to the segments first to last
+            first = np.searchsorted(positions, start, side="right")
+            last = np.searchsorted(positions, stop - 1, side="right")
+            inner = positions[first:last] - start
+            lengths = np.diff(inner, prepend=0, append=stop - start)
+            segments = np.repeat(np.arange(last - first + 1), lengths)
+            counts[first : last + 1] += np.bincount(
+                segments * (n_bins + 1) + bin_index,
+                minlength=(last - first + 1) * (n_bins + 1),
+            ).reshape(last - first + 1, n_bins + 1)
+
+    return np.cumsum(counts[:, :n_bins], axis=0)
+
+
+def _cumulative_counts(
+    energy_values: np.ndarray,
+    positions: np.ndarray,
+    energy_windows: list,
+    chunksize: int = CHUNKSIZE,
+) -> np.ndarray:
+    """
+    Counts the events between the first and each of given positions in several
+    energy windows, in a single pass over the events between the first and last
+    positions, ``chunksize`` events at a time.
+
+    Each energy is encoded by the elementary cell of the window bounds it falls in:
+    ``2 * j + 1`` if it is equal to the ``j``-th bound, ``2 * j`` if it is between the
+    bounds ``j - 1`` and ``j``. Since the windows exclude their bounds, the events of a
+    window are those of a contiguous range of cells.
+
+    Args:
+        energy_values (np.array): the energy values of the events
+        positions (np.array): sorted indices in the events
+        energy_windows (list of tuple): the energy windows, None meaning all energies
+        chunksize (int, optional): the number of events processed at once.
+            Defaults to CHUNKSIZE.
+
+    Returns:
+        np.array: the number of events with an index between the first position
+        (included) and each position (excluded), in each energy window, with shape
+        ``(len(energy_windows), len(positions))``
+    """
+    positions = np.asarray(positions, dtype=np.intp)
+    bounds = [window for window in energy_windows if window is not None]
+    bounds = np.unique(np.asarray(bounds, dtype=float).ravel())
+    n_cells = 2 * len(bounds) + 1
+
+    # number of events in each cell between the previous position and each position
+    counts = np.zeros((len(positions), n_cells), dtype=np.int64)
+    if len(positions) > 0:
+        for start in range(positions[0], positions[-1], chunksize):
+            stop = min(start + chunksize, positions[-1])
+            cells = 0
+            if len(bounds) > 0:
+                energies = energy_values[start:stop]
+                below = np.searchsorted(bounds, energies, side="left")
+                on_bound = np.searchsorted(bounds, energies, side="right") > below
+                cells = 2 * below + on_bound
 
-        # Create mask to only count pulses of any energy in section time window
-        idx = np.logical_and(time_values > t_min, time_values < t_max)
+            # the events of the chunk belong to the segments first to last
+            first = np.searchsorted(positions, start, side="right")
+            last = np.searchsorted(positions, stop - 1, side="right")
+            inner = positions[first:last] - start
+            lengths = np.diff(inner, prepend=0, append=stop - start)
+            segments = np.repeat(np.arange(last - first + 1), lengths)
+            counts[first : last + 1] += np.bincount(
+                segments * n_cells + cells, minlength=(last - first + 1) * n_cells
+            ).reshape(last - first + 1, n_cells)
 
-        counts = len(time_values[idx])
-        error = np.sqrt(len(time_values[idx]))
-        delta_t = t_max - t_min
-        count_rate = counts / delta_t
-        count_rate_err = error / delta_t
+    # counts since the first position, then before each cell
+    cumulative = np.zeros((len(positions), n_cells + 1), dtype=np.int64)
+    np.cumsum(np.cumsum(counts, axis=0), axis=1, out=cumulative[:, 1:])
 
-        return count_rate, count_rate_err
+    window_counts = np.zeros((len(energy_windows), len(positions)), dtype=np.int64)
+    for i, window in enumerate(energy_windows):
+        if window is None:
+            window_counts[i] = cumulative[:, -1]
+            continue
+        low, high = np.searchsorted(bounds, window)
+        if high > low:
+            window_counts[i] = cumulative[:, 2 * high + 1] - cumulative[:, 2 * low + 2]
+    return window_counts
 
 
 if __name__ == "__main__":
@@ -0,0 +1,240 @@
+import copy
+import numpy as np
+import pint
+from scipy.optimize import least_squares
+from typing import List, Dict, Literal, Sequence
+
+from libra_toolbox.tritium import ureg
+from libra_toolbox.tritium.model import (
+    Model,
+    quantity_to_activity,
+    _piecewise_exponential_integral,
+    _find_intervals,
+)
+from libra_toolbox.tritium.lsc_measurements import GasStream
+
+FITTABLE_PARAMETERS = ("k_top", "k_wall", "TBR")
+
+# step of the complex-step derivatives (exact to machine precision for any small step)
+COMPLEX_STEP = 1e-30
+
+
+class FitResult:
+    """
+    Result of :func:`fit_model`
+
+    Attributes:
+        parameters (dict[str, pint.Quantity]): the best-fit values of the parameters
+        std (dict[str, pint.Quantity]): the standard errors of the parameters
+        covariance (np.ndarray): the covariance matrix of the parameters, in the
+            units of ``parameters`` and in the same order
+        model (Model): a copy of the model with the best-fit parameters (not run)
+        residuals (pint.Quantity): the residuals (computed - measured) at the
+            sample times of all the streams
+        success (bool): True if the optimiser converged
+        message (str): the message of the optimiser
+    """
+
+    parameters: Dict[str, pint.Quantity]
+    std: Dict[str, pint.Quantity]
+    covariance: np.ndarray
+    model: Model
+    residuals: pint.Quantity
+    success: bool
+    message: str
+
+    def __str__(self):
+        lines = [
+            f"{name} = {value:~P} +/- {self.std[name]:~P}"
+            for name, value in self.parameters.items()
+        ]
+        return "\n".join(lines)
+
+
+def cumulative_release(
+    model: Model,
+    times: pint.Quantity,
+    release: Literal["top", "wall", "total"] = "top",
+) -> pint.Quantity:
+    """
+    Evaluates the exact cumulative release of tritium only at ``times``,
+    without running the model on a full time grid.
+
+    Args:
+        model (Model): the tritium model
+        times (pint.Quantity): the times at which the release is evaluated
+        release (str, optional): the release path, "top", "wall" or "total".
+            Defaults to "top".
+
+    Returns:
+        pint.Quantity: the cumulative release at ``times`` (particle)
+    """
+    kernel = _ReleaseKernel(model, times, release)
+    return kernel(np.ones(len(FITTABLE_PARAMETERS))) * ureg.particle
+
+
+class _ReleaseKernel:
+    """
+    Cumulative release at given times as a function of scaling factors
+    applied to ``k_top``, ``k_wall`` and ``TBR`` of a reference model.
+    Everything is converted to SI magnitudes once at construction.
+    Nothing is released before the start of the first irradiation.
+    """
+
+    def __init__(self, model: Model, times: pint.Quantity, release: str):
+        if release not in ("top", "wall", "total"):
+            raise ValueError(f"release must be 'top', 'wall' or 'total', got {release}")
+        self.release = release
+
+        self.times = np.atleast_1d(times.to(ureg.s).magnitude)
+        time_intervals = model._generate_time_intervals(self.times.max() * ureg.s)
+        self.t_starts, self.t_stops, self.sources = model._compile_intervals(
+            time_intervals
+        )
+        self.interval_index = _find_intervals(self.times, self.t_stops)
+        # the exact solution must not be extrapolated before the first interval
+        self.before_start = self.times < self.t_starts[0]
+        self.volume, self.g_wall, self.g_top = model._si_coefficients()
+
+    def __call__(self, factors):
+        """
+        Args:
+            factors (np.ndarray): scaling factors of ``k_top``, ``k_wall`` and ``TBR``,
+                with shape ``(..., 3)``
+
+        Returns:
+            np.ndarray: the cumulative release (particle) with shape ``(..., n_times)``
+        """
+        factors = np.asarray(factors)
+        g_top = factors[..., 0] * self.g_top
+        g_wall = factors[..., 1] * self.g_wall
+        sources = factors[..., 2, None] * self.sources
+        integral = _piecewise_exponential_integral(
+            self.times,
+            self.interval_index,
+            self.t_starts,
+            self.t_stops,
+            sources,
+            self.volume,
+            g_top + g_wall,
+        )
+        if self.release == "top":
+            conductance = g_top
+        elif self.release == "wall":
+            conductance = g_wall
+        else:
+            conductance = g_top + g_wall
+        return np.where(self.before_start, 0, conductance[..., None] * integral)
+
+
+def fit_model(
+    model: Model,
+    streams: GasStream | List[GasStream],
+    parameters: Sequence[str] = ("k_top", "k_wall"),
+    releases: str | List[str] = "top",
+    form: Literal["total", "soluble", "insoluble"] = "total",
+    **kwargs,
+) -> FitResult:
+    """
+    Fits parameters of a tritium model to the cumulative activity measured in
+    one or more gas streams, by non-linear least squares.
+
+    The model is only evaluated at the sample times of the streams, with its
+    exact solution (see :meth:`Model.run`). The Jacobian of the residuals is
+    computed by complex-step differentiation of that solution, which is exact
+    to machine precision, and is used for the covariance of the parameters.
+
+    The fitted parameters are scaling factors of the parameters of ``model``,
+    which are used as initial guess and must not be zero. The
+    times of the samples relative to the ``start_time`` of each stream are
+    taken as the times of the model.
+
+    Args:
+        model (Model): the tritium model, the initial guess
+        streams (GasStream | list[GasStream]): the measured gas stream(s).
+            Background must have been substracted.
+        parameters (sequence of str, optional): the names of the fitted parameters,
+            among "k_top", "k_wall" and "TBR". Defaults to ("k_top", "k_wall").
+        releases (str | list[str], optional): for each stream, the release path
+            it collects, "top", "wall" or "total". Defaults to "top".
+        form (str, optional): the form of the measured activity, passed to
+            ``GasStream.get_cumulative_activity``. Defaults to "total".
+        kwargs: other arguments passed to ``scipy.optimize.least_squares``
+
+    Raises:
+        ValueError: if a parameter cannot be fitted or if its initial value is zero
+
+    Returns:
+        FitResult: the result of the fit
+    """
+    if isinstance(streams, GasStream):
+        streams = [streams]
+    if isinstance(releases, str):
+        releases = [releases] * len(streams)
+    if len(releases) != len(streams):
+        raise ValueError("releases and streams must have the same length")
+    for name in parameters:
+        if name not in FITTABLE_PARAMETERS:
+            raise ValueError(
+                f"Cannot fit {name}, parameters must be among {FITTABLE_PARAMETERS}"
+            )
+        if np.any(getattr(model, name).magnitude == 0):
+            raise ValueError(
+                f"The initial value of {name} must not be zero, since the fit "
+                "scales it"
+            )
+    fitted = [FITTABLE_PARAMETERS.index(name) for name in parameters]
+
+    kernels = []
+    measurements = []
+    for stream, release in zip(streams, releases):
+        kernels.append(_ReleaseKernel(model, stream.relative_times_as_pint, release))
+        activity = stream.get_cumulative_activity(form=form)
+        measurements.append(activity.to(ureg.Bq).magnitude)
+    measurements = np.concatenate(measurements)
+    activity_per_particle = (
+        quantity_to_activity(1 * ureg.particle).to(ureg.Bq).magnitude
+    )
+
+    def predict(x):
+        factors = np.ones(x.shape[:-1] + (len(FITTABLE_PARAMETERS),), dtype=x.dtype)
+        factors[..., fitted] = x
+        released = [kernel(factors) for kernel in kernels]
+        return activity_per_particle * np.concatenate(released, axis=-1)
+
+    def residuals(x):
+        return predict(x) - measurements
+
+    def jacobian(x):
+        # all the complex-step perturbations are evaluated as one batch
+        steps = x + 1j * COMPLEX_STEP * np.eye(len(x))
+        return predict(steps).imag.T / COMPLEX_STEP
+
+    kwargs.setdefault("bounds", (0, np.inf))
+    res = least_squares(residuals, np.ones(len(fitted)), jac=jacobian, **kwargs)
+
+    # covariance of the scaling factors from the Gauss-Newton approximation
+    dof = max(len(measurements) - len(fitted), 1)
+    variance = 2 * res.cost / dof
+    covariance_factors = variance * np.linalg.pinv(res.jac.T @ res.jac)
+
+    initial_values = [getattr(model, name) for name in parameters]
+    result = FitResult()
+    result.parameters = {
+        name: factor * value
+        for name, factor, value in zip(parameters, res.x, initial_values)
+    }
+    scales = np.array([value.magnitude for value in initial_values])
+    result.covariance = covariance_factors * np.outer(scales, scales)
+    result.std = {
+        name: np.sqrt(result.covariance[i, i]) * value.units
+        for i, (name, value) in enumerate(zip(parameters, initial_values))
+    }
+    result.model = copy.copy(model)
+    result.model.reset()
+    for name, value in result.parameters.items():
+        setattr(result.model, name, value)
+    result.residuals = res.fun * ureg.Bq
+    result.success = res.success
+    result.message = res.message
+    return result
@@ -1,5 +1,13 @@
+import glob
+import hashlib
+import importlib.util
+import json
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
-from typing import List, Dict
+from typing import List, Dict, Tuple
 import pint
 import pint.facets
 from libra_toolbox.tritium import ureg
@@ -7,10 +15,18 @@ from datetime import datetime, timedelta
 import warnings
 from typing import Literal
 
-
 # config
 DATE_FORMAT = "%m/%d/%Y %I:%M %p"
 
+# columns of the LSC files used by LSCFileReader (in addition to the labels column)
+USED_COLUMNS = ("Bq:1", "Count Time", "LUM")
+
+# number of parsed LSC files kept in memory by LSCFileReader
+CACHE_SIZE = 256
+
+# parsed LSC files (data, header content, quench set) by cache key, in LRU order
+_FILE_CACHE = OrderedDict()
+
 
 class LSCFileReader:
     quench_set: str | None
@@ -21,26 +37,45 @@ class LSCFileReader:
         file_path: str,
         vial_labels: List[str | None] = None,
         labels_column: str = None,
+        cache_dir: str = None,
     ):
         """Reads a LSC file and extracts the Bq:1 values and labels
 
+        The parsed files are kept in a process-wide cache of the ``CACHE_SIZE``
+        most recently read files, keyed by the absolute path, modification time
+        and size of the files, so reading an unchanged file again does not parse it.
+
         Args:
             file_path: Path to the LSC file.
             vial_labels: List of vial labels. Defaults to None.
             labels_column: Column name in the file that contains the vial labels. Defaults to None.
+            cache_dir: if provided, the parsed file is also cached in this
+                directory as parquet (requires pyarrow), so that other
+                processes do not parse it again. Defaults to None.
         """
         self.file_path = file_path
         self.vial_labels = vial_labels
         self.labels_column = labels_column
+        self.cache_dir = cache_dir
         self.data = None
         self.header_content = None
         self.quench_set = None
+        self._labelled_values_cache = None
 
-    def read_file(self):
+    def read_file(self, only_used_columns: bool = False, use_cache: bool = True):
         """
         Reads the LSC file and extracts the data in self.data and the vial labels
         (if provided) in self.vial_labels
 
+        The file is read in a single pass: the header is read line by line up to
+        the line starting with S# and the open file is then given to the CSV parser.
+
+        Args:
+            only_used_columns: if True, only the columns in ``USED_COLUMNS`` and
+                the labels column are loaded in self.data. Defaults to False.
+            use_cache: if False, the file is parsed even if it is cached.
+                Defaults to True.
+
         Raises:
             ValueError: If both vial_labels and labels_column are provided or if none of them are provided
         """
@@ -51,24 +86,32 @@ class LSCFileReader:
         ):
             raise ValueError("Provide either vial_labels or labels_column")
 
-        # first read the file without dataframe to find the line starting with S#
-        header_lines = []
-        with open(self.file_path, "r") as file:
-            lines = file.readlines()
-            for i, line in enumerate(lines):
-                if line.startswith("Quench Set:"):
-                    quench_set_line_idx = i + 1
-                if line.startswith("S#"):
-                    start = i
-                    break
-                header_lines.append(line)
-        self.header_content = "".join(header_lines)
-        self.quench_set = lines[quench_set_line_idx].strip()
-        # read the file with dataframe starting from the line with S#
-        self.data = pd.read_csv(self.file_path, skiprows=start)
-
-        # check if last column is all NaN
-        if self.data[self.data.columns[-1]].isnull().all():
+        columns = None
+        if only_used_columns:
+            columns = set(USED_COLUMNS)
+            if self.labels_column is not None:
+                columns.add(self.labels_column)
+            columns = sorted(columns)
+
+        key = _cache_key(self.file_path, columns)
+        if use_cache and key in _FILE_CACHE:
+            _FILE_CACHE.move_to_end(key)
+            data, self.header_content, self.quench_set = _FILE_CACHE[key]
+        elif use_cache and self.cache_dir is not None:
+            data, self.header_content, self.quench_set = _read_cached_file(
+                self.cache_dir, key, self._parse, columns
+            )
+        else:
+            data, self.header_content, self.quench_set = self._parse(columns)
+        if use_cache:
+            _FILE_CACHE[key] = (data, self.header_content, self.quench_set)
+            while len(_FILE_CACHE) > CACHE_SIZE:
+                _FILE_CACHE.popitem(last=False)
+        # the cached dataframe is never modified
+        self.data = data.copy()
+
+        # check if last column is all NaN, when all the columns of the file are read
+        if columns is None and self.data[self.data.columns[-1]].isnull().all():
             warnings.warn(
                 "There seem to be an issue with the last column. Is the format of the file correct?"
             )
@@ -76,6 +119,42 @@ class LSCFileReader:
         if self.labels_column is not None:
             self.vial_labels = self.data[self.labels_column].tolist()
 
+    def _parse(self, columns: List[str] = None):
+        """
+        Parses the LSC file.
+
+        Args:
+            columns: the columns loaded, all if None. Defaults to None.
+
+        Returns:
+            pandas.DataFrame: the data
+            str: the header content
+            str: the quench set
+        """
+        usecols = None
+        if columns is not None:
+            usecols = lambda column: column in columns
+
+        header_lines = []
+        quench_set = None
+        quench_set_line = False
+        with open(self.file_path, "r") as file:
+            # read the header up to the line starting with S#
+            while True:
+                position = file.tell()
+                line = file.readline()
+                if not line or line.startswith("S#"):
+                    break
+                if quench_set_line:
+                    quench_set = line.strip()
+                quench_set_line = line.startswith("Quench Set:")
+                header_lines.append(line)
+
+            # read the data with dataframe starting from the line with S#
+            file.seek(position)
+            data = pd.read_csv(file, usecols=usecols)
+        return data, "".join(header_lines), quench_set
+
     def get_bq1_values(self) -> List[float]:
         assert self.data is not None
         return self.data["Bq:1"].tolist()
@@ -89,17 +168,34 @@ class LSCFileReader:
         Returns:
             Dictionary with vial labels as keys and Bq:1 values as values
         """
-        if self.vial_labels is None:
-            raise ValueError("Vial labels must be provided")
+        return dict(self._labelled_values())
 
-        assert len(self.vial_labels) == len(
-            self.get_bq1_values()
-        ), "Vial labels and Bq:1 values are not equal in length, remember to give None as a label for missing vials"
+    def _labelled_values(self) -> Dict[str | None, float]:
+        """
+        Same as ``get_bq1_values_with_labels`` but the dictionary is built once
+        and reused as long as self.data and self.vial_labels are not replaced.
+        It must not be modified.
+        """
+        cache = self._labelled_values_cache
+        if (
+            cache is None
+            or cache[0] is not self.data
+            or cache[1] is not self.vial_labels
+        ):
+            if self.vial_labels is None:
+                raise ValueError("Vial labels must be provided")
 
-        values = self.get_bq1_values()
-        labelled_values = {label: val for label, val in zip(self.vial_labels, values)}
+            assert len(self.vial_labels) == len(
+                self.get_bq1_values()
+            ), "Vial labels and Bq:1 values are not equal in length, remember to give None as a label for missing vials"
 
-        return labelled_values
+            values = self.get_bq1_values()
+            labelled_values = {
+                label: val for label, val in zip(self.vial_labels, values)
+            }
+            cache = (self.data, self.vial_labels, labelled_values)
+            self._labelled_values_cache = cache
+        return cache[2]
 
     def get_count_times(self) -> List[float]:
         assert self.data is not None
@@ -109,6 +205,187 @@ class LSCFileReader:
         assert self.data is not None
         return self.data["LUM"].tolist()
 
+    def to_table(self) -> pd.DataFrame:
+        """Returns the labelled vials of the file as a table (see ``read_lsc_files``)
+
+        Raises:
+            ValueError: If vial labels are not provided
+
+        Returns:
+            pandas.DataFrame: one row per labelled vial, indexed by (file, label)
+        """
+        assert self.data is not None
+        if self.vial_labels is None:
+            raise ValueError("Vial labels must be provided")
+        assert len(self.vial_labels) == len(
+            self.data
+        ), "Vial labels and Bq:1 values are not equal in length, remember to give None as a label for missing vials"
+
+        table = pd.DataFrame(
+            {
+                "file": str(self.file_path),
+                "label": pd.Series(self.vial_labels, dtype=object),
+                "activity": self.data["Bq:1"].to_numpy(dtype=float),
+                "count_time": self.data["Count Time"].to_numpy(dtype=float),
+                "lum": (
+                    self.data["LUM"].to_numpy(dtype=float)
+                    if "LUM" in self.data
+                    else np.nan
+                ),
+                "quench_set": self.quench_set,
+                "header_content": self.header_content,
+            }
+        )
+        table = table[table["label"].notna()]
+        return table.set_index(["file", "label"])
+
+
+def clear_cache():
+    """Empties the in-memory cache of the parsed LSC files"""
+    _FILE_CACHE.clear()
+
+
+def _cache_key(file_path: str, columns: List[str] | None) -> str:
+    """
+    Returns the cache key of a LSC file, from its absolute path,
+    modification time and size and the loaded columns.
+    """
+    stat = os.stat(file_path)
+    description = repr(
+        (os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size, columns)
+    )
+    return hashlib.sha1(description.encode()).hexdigest()
+
+
+def _read_cached_file(cache_dir: str, key: str, parse, columns: List[str] | None):
+    """
+    Reads a parsed LSC file from the parquet cache in ``cache_dir``, or parses
+    it with ``parse(columns)`` and adds it to the cache.
+
+    Returns:
+        pandas.DataFrame: the data
+        str: the header content
+        str: the quench set
+
+    Raises:
+        ImportError: if pyarrow is not installed
+    """
+    if importlib.util.find_spec("pyarrow") is None:
+        raise ImportError("pyarrow is required for the on-disk cache")
+
+    data_path = os.path.join(cache_dir, f"{key}.parquet")
+    metadata_path = os.path.join(cache_dir, f"{key}.json")
+    # the metadata is written last, so the entry is complete if it exists
+    if os.path.exists(metadata_path):
+        with open(metadata_path, "r") as f:
+            metadata = json.load(f)
+        data = pd.read_parquet(data_path)
+        return data, metadata["header_content"], metadata["quench_set"]
+
+    data, header_content, quench_set = parse(columns)
+    os.makedirs(cache_dir, exist_ok=True)
+    # written under temporary names so that a cache entry is never partial
+    tmp_path = f"{data_path}.{os.getpid()}.tmp"
+    data.to_parquet(tmp_path)
+    os.replace(tmp_path, data_path)
+    tmp_path = f"{metadata_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"header_content": header_content, "quench_set": quench_set}, f)
+    os.replace(tmp_path, metadata_path)
+    return data, header_content, quench_set
+
+
+def read_lsc_files(
+    files: str | List[str],
+    vial_labels: Dict[str, List[str | None]] = None,
+    labels_column: str = None,
+    workers: int | None = None,
+    only_used_columns: bool = True,
+    cache_dir: str = None,
+) -> pd.DataFrame:
+    """
+    Reads many LSC files and collects their labelled vials in a single table.
+
+    The files are parsed in parallel with a ``concurrent.futures.ProcessPoolExecutor``.
+
+    Example:
+
+    .. code-block:: python
+
+        table = read_lsc_files("lsc_exports/", labels_column="SMPL_ID")
+        samples = LSCSample.from_table(table)
+        sample = samples["lsc_exports/1L_BL-1.csv", "1L-BL-1"]
+
+    Args:
+        files: a directory (all the .csv files in it), a glob pattern or a list of files
+        vial_labels: the vial labels of each file, with the paths or the names
+            of the files as keys. Files without labels use ``labels_column``.
+            Defaults to None.
+        labels_column: Column name in the files that contains the vial labels.
+            Defaults to None.
+        workers: the number of processes. If 1, the files are read in the
+            current process. Defaults to ``os.cpu_count()``.
+        only_used_columns: passed to ``LSCFileReader.read_file``. Defaults to True.
+        cache_dir: the directory of the on-disk cache of the parsed files (see
+            ``LSCFileReader``). Defaults to None.
+
+    Raises:
+        FileNotFoundError: If no file is found
+
+    Returns:
+        pandas.DataFrame: one row per labelled vial (vials labelled None are
+        skipped), indexed by (file, label), with the columns ``activity`` (Bq:1),
+        ``count_time``, ``lum``, ``quench_set`` and ``header_content``
+    """
+    if isinstance(files, (str, os.PathLike)):
+        if os.path.isdir(files):
+            files = glob.glob(os.path.join(files, "*.csv"))
+        else:
+            files = glob.glob(str(files))
+        files = sorted(files)
+    files = [str(file) for file in files]
+    if not files:
+        raise FileNotFoundError("No LSC file found")
+
+    vial_labels = {str(key): value for key, value in (vial_labels or {}).items()}
+    tasks = []
+    for file in files:
+        labels = vial_labels.get(file, vial_labels.get(os.path.basename(file)))
+        column = labels_column if labels is None else None
+        tasks.append((file, labels, column, only_used_columns, cache_dir))
+
+    if workers is None:
+        workers = os.cpu_count()
+    if workers == 1 or len(tasks) == 1:
+        tables = [_read_lsc_table(task) for task in tasks]
+    else:
+        chunksize = max(1, len(tasks) // (4 * workers))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            tables = list(executor.map(_read_lsc_table, tasks, chunksize=chunksize))
+    return pd.concat(tables)
+
+
+def _read_lsc_table(task):
+    """
+    Reads a LSC file in a worker.
+
+    Args:
+        task (tuple): the path, the vial labels, the labels column,
+            ``only_used_columns`` and the cache directory
+
+    Returns:
+        pandas.DataFrame: the table of the file (see ``LSCFileReader.to_table``)
+    """
+    file_path, vial_labels, labels_column, only_used_columns, cache_dir = task
+    reader = LSCFileReader(
+        file_path,
+        vial_labels=vial_labels,
+        labels_column=labels_column,
+        cache_dir=cache_dir,
+    )
+    reader.read_file(only_used_columns=only_used_columns)
+    return reader.to_table()
+
 
 class LSCSample:
     activity: pint.Quantity
@@ -133,15 +410,7 @@ class LSCSample:
         Raises:
             ValueError: If background has already been substracted
         """
-        if self.background_substracted:
-            raise ValueError("Background already substracted")
-        self.activity -= background_sample.activity
-        if self.activity.magnitude < 0:
-            warnings.warn(
-                f"Activity of {self.name} is negative after substracting background. Setting to zero."
-            )
-            self.activity = 0 * ureg.Bq
-        self.background_substracted = True
+        _substract_background([self], [background_sample.activity.m_as("Bq")])
 
     @staticmethod
     def from_file(file_reader: LSCFileReader, vial_name: str) -> "LSCSample":
@@ -157,7 +426,7 @@ class LSCSample:
         Returns:
             the LSCSample object
         """
-        values = file_reader.get_bq1_values_with_labels()
+        values = file_reader._labelled_values()
         if vial_name not in values:
             raise ValueError(f"Vial {vial_name} not found in the file reader.")
         activity = values[vial_name] * ureg.Bq
@@ -165,6 +434,25 @@ class LSCSample:
         sample.origin_file = file_reader.file_path
         return sample
 
+    @staticmethod
+    def from_table(table: pd.DataFrame) -> Dict[Tuple[str, str], "LSCSample"]:
+        """Creates the LSCSample objects of all the vials of a table
+
+        Args:
+            table (pandas.DataFrame): the table of the vials, indexed by
+                (file, label), as returned by ``read_lsc_files``
+
+        Returns:
+            the LSCSample objects with (file, label) as keys
+        """
+        samples = {}
+        activities = table["activity"].to_numpy(dtype=float).tolist()
+        for (file, label), activity in zip(table.index, activities):
+            sample = LSCSample(ureg.Quantity(activity, ureg.Bq), label)
+            sample.origin_file = file
+            samples[file, label] = sample
+        return samples
+
 
 class LIBRASample:
     samples: List[LSCSample]
@@ -186,8 +474,16 @@ class LIBRASample:
         return sample_time - start_time
 
     def substract_background(self, background_sample: LSCSample):
-        for sample in self.samples:
-            sample.substract_background(background_sample)
+        """Substracts the background activity from the activity of all the vials
+
+        Args:
+            background_sample (LSCSample): Background sample
+
+        Raises:
+            ValueError: If background has already been substracted from a vial
+        """
+        backgrounds = np.full(len(self.samples), background_sample.activity.m_as("Bq"))
+        _substract_background(self.samples, backgrounds)
 
     def get_soluble_activity(self):
         act = 0
@@ -231,6 +527,101 @@ class GasStream:
             self.start_time = start_time
 
         self.name = name
+        self._activity_cache = None
+
+    def _activity_arrays(self):
+        """
+        Gathers the activities of the vials in a (samples, vials) array (in Bq),
+        samples with fewer vials being padded with zeros, and whether the
+        background of all the vials has been substracted.
+        The arrays are reused as long as no sample, vial or activity is replaced.
+
+        Returns:
+            np.ndarray: the activities (in Bq)
+            bool: True if the background of all the vials has been substracted
+        """
+        lsc_samples = [sample.samples for sample in self.samples]
+        quantities = [
+            lsc_sample.activity for vials in lsc_samples for lsc_sample in vials
+        ]
+        layout = tuple(len(vials) for vials in lsc_samples)
+        background_substracted = all(
+            lsc_sample.background_substracted
+            for vials in lsc_samples
+            for lsc_sample in vials
+        )
+
+        cache = self._activity_cache
+        if (
+            cache is None
+            or cache[1] != layout
+            or any(a is not b for a, b in zip(cache[0], quantities))
+        ):
+            activities = np.zeros((len(layout), max(layout, default=0)))
+            for i, vials in enumerate(lsc_samples):
+                activities[i, : len(vials)] = [
+                    lsc_sample.activity.m_as("Bq") for lsc_sample in vials
+                ]
+            cache = (quantities, layout, activities)
+            self._activity_cache = cache
+        return cache[2], background_substracted
+
+    @property
+    def activities(self) -> pint.Quantity:
+        """
+        The activities of the vials of the samples as a pint.Quantity array of
+        shape (samples, vials), samples with fewer vials being padded with zeros
+        """
+        activities, _ = self._activity_arrays()
+        return ureg.Quantity(activities.copy(), ureg.Bq)
+
+    def get_activity(
+        self, form: Literal["total", "soluble", "insoluble"] = "total"
+    ) -> pint.Quantity:
+        """Calculates the activity of each sample of the gas stream.
+        The first two vials of a sample are soluble and the others insoluble.
+
+        Args:
+            form: the form in which the activity is calculated.
+
+        Raises:
+            ValueError: If the form is unknown
+
+        Returns:
+            the activity of the samples as a pint.Quantity object
+        """
+        activities, _ = self._activity_arrays()
+        if form == "total":
+            activity = activities.sum(axis=1)
+        elif form == "soluble":
+            activity = activities[:, :2].sum(axis=1)
+        elif form == "insoluble":
+            activity = activities[:, 2:].sum(axis=1)
+        else:
+            raise ValueError(
+                f"form must be 'total', 'soluble' or 'insoluble', got {form}"
+            )
+        return ureg.Quantity(activity, ureg.Bq)
+
+    def substract_background(self, background):
+        """Substracts the background activity from all the vials of the gas stream
+        at once, with a single warning for all the negative activities
+
+        Args:
+            background: the background activity, either a LSCSample or a
+                pint.Quantity for all the vials, a pint.Quantity array with one
+                value per sample (eg. time-dependent background) or of shape
+                (samples, vials), or a dictionary with the origin files of the
+                vials as keys and LSCSample or pint.Quantity as values
+
+        Raises:
+            ValueError: If background has already been substracted from a vial
+        """
+        backgrounds = _background_activities(background, self.samples)
+        _substract_background(
+            [lsc_sample for sample in self.samples for lsc_sample in sample.samples],
+            backgrounds,
+        )
 
     def get_cumulative_activity(
         self, form: Literal["total", "soluble", "insoluble"] = "total"
@@ -247,25 +638,12 @@ class GasStream:
             the cumulative activity as a pint.Quantity object
         """
         # check that background has been substracted
-        if any(
-            not lsc_sample.background_substracted
-            for sample in self.samples
-            for lsc_sample in sample.samples
-        ):
+        _, background_substracted = self._activity_arrays()
+        if not background_substracted:
             raise ValueError(
                 "Background must be substracted before calculating cumulative activity"
             )
-        cumulative_activity = []
-        for sample in self.samples:
-            if form == "total":
-                cumulative_activity.append(sample.get_total_activity())
-            elif form == "soluble":
-                cumulative_activity.append(sample.get_soluble_activity())
-            elif form == "insoluble":
-                cumulative_activity.append(sample.get_insoluble_activity())
-        cumulative_activity = ureg.Quantity.from_list(cumulative_activity)
-        cumulative_activity = cumulative_activity.cumsum()
-        return cumulative_activity
+        return self.get_activity(form).cumsum()
 
     @property
     def relative_times(self) -> List[timedelta]:
@@ -281,8 +659,8 @@ class GasStream:
         The relative times of the samples in the GasStream based on the start_time
         as a pint.Quantity object
         """
-        times = [t.total_seconds() * ureg.s for t in self.relative_times]
-        return ureg.Quantity.from_list(times).to(ureg.day)
+        times = [t.total_seconds() for t in self.relative_times]
+        return ureg.Quantity(np.array(times, dtype=float), ureg.s).to(ureg.day)
 
 
 class LIBRARun:
@@ -293,6 +671,34 @@ class LIBRARun:
         else:
             self.start_time = start_time
 
+    def substract_background(self, background):
+        """Substracts the background activity from all the vials of all the gas
+        streams at once, with a single warning for all the negative activities
+
+        Args:
+            background: the background activity of all the streams (see
+                ``GasStream.substract_background``) or a list with the
+                background activity of each stream
+
+        Raises:
+            ValueError: If background has already been substracted from a vial
+        """
+        if isinstance(background, list):
+            if len(background) != len(self.streams):
+                raise ValueError("Provide one background per gas stream")
+            backgrounds = background
+        else:
+            backgrounds = [background] * len(self.streams)
+
+        lsc_samples = []
+        activities = []
+        for stream, stream_background in zip(self.streams, backgrounds):
+            activities.append(_background_activities(stream_background, stream.samples))
+            lsc_samples += [
+                lsc_sample for sample in stream.samples for lsc_sample in sample.samples
+            ]
+        _substract_background(lsc_samples, np.concatenate(activities))
+
 
 class BABY100mLRun(LIBRARun):
     def __init__(self, inner_vessel_stream, start_time):
@@ -302,3 +708,90 @@ class BABY100mLRun(LIBRARun):
 class BABY1LRun(LIBRARun):
     def __init__(self, inner_vessel_stream, outer_vessel_stream, start_time):
         super().__init__([inner_vessel_stream, outer_vessel_stream], start_time)
+
+
+def _substract_background(lsc_samples: List[LSCSample], backgrounds):
+    """
+    Substracts background activities from LSC samples at once. Negative
+    activities are set to zero with a single warning.
+
+    Args:
+        lsc_samples (list[LSCSample]): the samples
+        backgrounds (np.ndarray): the background activity of each sample (in Bq)
+
+    Raises:
+        ValueError: If background has already been substracted from a sample
+    """
+    if any(sample.background_substracted for sample in lsc_samples):
+        raise ValueError("Background already substracted")
+
+    activities = [sample.activity.m_as("Bq") for sample in lsc_samples]
+    activities = np.array(activities, dtype=float) - backgrounds
+
+    negative = activities < 0
+    if np.any(negative):
+        names = [
+            sample.name
+            for sample, is_negative in zip(lsc_samples, negative)
+            if is_negative
+        ]
+        if len(names) == 1:
+            warnings.warn(
+                f"Activity of {names[0]} is negative after substracting background. Setting to zero."
+            )
+        else:
+            warnings.warn(
+                f"Activities of {len(names)} samples ({', '.join(map(str, names))}) are negative after substracting background. Setting to zero."
+            )
+    activities = np.clip(activities, 0, None)
+
+    for sample, activity in zip(lsc_samples, activities.tolist()):
+        # the quantity is created in the unit registry of the sample
+        sample.activity = type(sample.activity)(activity, "Bq")
+        sample.background_substracted = True
+
+
+def _background_activities(background, samples: List[LIBRASample]) -> np.ndarray:
+    """
+    Converts a background (see ``GasStream.substract_background``) to the
+    background activity of each vial of the samples.
+
+    Args:
+        background: the background activity
+        samples (list[LIBRASample]): the samples
+
+    Raises:
+        ValueError: If the background does not match the samples
+
+    Returns:
+        np.ndarray: the background activity of each vial (in Bq)
+    """
+    vials = [lsc_sample for sample in samples for lsc_sample in sample.samples]
+    if isinstance(background, dict):
+        activities = []
+        for vial in vials:
+            if vial.origin_file not in background:
+                raise ValueError(
+                    f"No background for the origin file {vial.origin_file} of {vial}"
+                )
+            activities.append(_activity_in_bq(background[vial.origin_file]))
+        return np.array(activities, dtype=float)
+
+    activities = np.asarray(_activity_in_bq(background), dtype=float)
+    if activities.ndim == 0:
+        return np.full(len(vials), activities)
+    if len(activities) != len(samples):
+        raise ValueError("Provide one background activity per sample")
+
+    layout = np.array([len(sample.samples) for sample in samples])
+    is_vial = np.arange(layout.max(initial=0)) < layout[:, None]
+    if activities.ndim == 1:
+        activities = activities[:, None]
+    return np.broadcast_to(activities, is_vial.shape)[is_vial]
+
+
+def _activity_in_bq(activity):
+    """Magnitude in Bq of a LSCSample or pint.Quantity"""
+    if isinstance(activity, LSCSample):
+        activity = activity.activity
+    return activity.m_as("Bq")
@@ -2,9 +2,13 @@ import pint
 import numpy as np
 from scipy.integrate import cumulative_trapezoid
 from scipy.integrate import solve_ivp
+from scipy.sparse import diags
 
 from libra_toolbox.tritium import ureg
 
+# solve_ivp methods making use of the Jacobian
+JACOBIAN_SOLVERS = ("BDF", "Radau", "LSODA")
+
 SPECIFIC_ACT = 3.57e14 * ureg.Bq * ureg.g**-1
 MOLAR_MASS = 6.032 / 2 * ureg.g * ureg.mol**-1
 
@@ -90,6 +94,19 @@ class Model:
 
         self.concentrations = []
         self.times = []
+        self._times_buffer = None
+        self._concentrations_buffer = None
+        self._checkpoints = None
+        self._irradiation_cache = None
+
+    def __copy__(self):
+        # copies do not share the result buffers
+        model = self.__class__.__new__(self.__class__)
+        model.__dict__.update(self.__dict__)
+        model._times_buffer = None
+        model._concentrations_buffer = None
+        model._checkpoints = None
+        return model
 
     @property
     def volume(self):
@@ -134,25 +151,59 @@ class Model:
     def source(self, t):
         """
         Calculate the source term at a given time ``t``.
-        This method iterates through the list of irradiations and checks if the
-        given time ``t`` falls within any irradiation period. If it does, it returns
-        the product of the Tritium Breeding Ratio (TBR) and the neutron rate.
-        If ``t`` does not fall within any irradiation period, it returns zero.
+        If ``t`` falls strictly within an irradiation period, the source is
+        the product of the Tritium Breeding Ratio (TBR) and the neutron rate,
+        otherwise it is zero.
+
+        The irradiations are compiled once into sorted arrays of start and stop
+        times, so that the lookup is a binary search. ``t`` can also be an array
+        of times, in which case the source is evaluated at all the times at once.
+        The irradiations are assumed not to overlap.
 
         Args:
-            t (pint.Quantity): The time at which to calculate the source term.
+            t (pint.Quantity): The time(s) at which to calculate the source term.
 
         Returns:
             pint.Quantity: The source term at time ``t``. This is the product of TBR and
             neutron rate if ``t`` is within an irradiation period, otherwise zero.
+            For an array of times, the last axis is the times.
+        """
+        starts, stops = self._irradiation_arrays()
+        t = t.to(ureg.s).magnitude
+        # the last irradiation starting strictly before t
+        index = np.searchsorted(starts, t, side="left") - 1
+        if len(stops) > 0:
+            on = (index >= 0) & (t < stops[np.maximum(index, 0)])
+        else:
+            on = np.zeros(np.shape(t), dtype=bool)
+
+        production = self.TBR * self.neutron_rate
+        production = np.reshape(production, np.shape(production) + (1,) * np.ndim(on))
+        return production * on
+
+    def _irradiation_arrays(self):
         """
+        Returns the start and stop times of the irradiations (s), sorted by
+        start time. They are only recompiled when the irradiations change.
 
-        for irradiation in self.irradiations:
-            irradiation_start = irradiation[0]
-            irradiation_stop = irradiation[1]
-            if irradiation_start < t < irradiation_stop:
-                return self.TBR * self.neutron_rate
-        return 0 * self.TBR * self.neutron_rate
+        Returns:
+            np.ndarray: start times of the irradiations (s)
+            np.ndarray: stop times of the irradiations (s)
+        """
+        # the cache holds references to the quantities so that their ids stay valid
+        bounds = [time for irradiation in self.irradiations for time in irradiation[:2]]
+        cache = self._irradiation_cache
+        if (
+            cache is None
+            or len(cache[0]) != len(bounds)
+            or any(old is not new for old, new in zip(cache[0], bounds))
+        ):
+            starts = np.array([t.to(ureg.s).magnitude for t in bounds[0::2]], float)
+            stops = np.array([t.to(ureg.s).magnitude for t in bounds[1::2]], float)
+            order = np.argsort(starts, kind="stable")
+            cache = (bounds, starts[order], stops[order])
+            self._irradiation_cache = cache
+        return cache[1], cache[2]
 
     def Q_wall(self, c_salt):
         """
@@ -235,49 +286,385 @@ class Model:
 
         return time_intervals
 
-    def run(self, t_final):
+    def _si_coefficients(self):
+        r"""
+        Converts the parameters of the model to SI magnitudes so that the ODE
+        can be evaluated on plain floats.
+
+        Returns:
+            float: the volume of the salt (m3)
+            float: the wall conductance :math:`A_\mathrm{wall} \ k_\mathrm{wall}` (m3/s)
+            float: the top conductance :math:`A_\mathrm{top} \ k_\mathrm{top}` (m3/s)
+        """
+        volume = self.volume.to(ureg.m**3).magnitude
+        g_wall = (self.A_wall * self.k_wall).to(ureg.m**3 * ureg.s**-1).magnitude
+        g_top = (self.A_top * self.k_top).to(ureg.m**3 * ureg.s**-1).magnitude
+        return volume, g_wall, g_top
+
+    def _compile_intervals(self, time_intervals):
+        """
+        Converts the time intervals to SI magnitudes and evaluates the (constant)
+        source term on each of them.
+
+        Args:
+            time_intervals (list[tuple[pint.Quantity, pint.Quantity]]): the
+                intervals returned by ``_generate_time_intervals``
+
+        Returns:
+            np.ndarray: start times of the intervals (s)
+            np.ndarray: stop times of the intervals (s)
+            np.ndarray: source term on each interval (particle/s), the last
+            axis being the intervals
         """
+        source_units = ureg.particle * ureg.s**-1
+        t_starts = np.array([t0.to(ureg.s).magnitude for t0, _ in time_intervals])
+        t_stops = np.array([tf.to(ureg.s).magnitude for _, tf in time_intervals])
+        midpoints = ureg.Quantity(0.5 * (t_starts + t_stops), ureg.s)
+        sources = self.source(midpoints).to(source_units).magnitude
+        return t_starts, t_stops, sources
+
+    def run(
+        self,
+        t_final,
+        solver: str = "BDF",
+        compiled: bool = True,
+        n_points: int = 1000,
+        resolution: pint.Quantity = None,
+        t_eval: pint.Quantity = None,
+        adaptive: bool = False,
+        incremental: bool = False,
+    ):
+        r"""
         Solves the ODE between 0 and ``t_final``.
         It first generates the different time intervals based on the irradiations and non-irradiation periods.
-        Then, it solves the ODE for each interval with ``scipy.optimize.minimize`` and concatenates the results.
+        Then, it solves the ODE for each interval and concatenates the results.
         The results are stored in the ``concentrations`` and ``times`` attributes.
+        Their memory is reused by the next call to ``run``, copy them to keep them.
+
+        With ``solver="analytic"``, the ODE is not integrated numerically.
+        Since the source term is constant on each interval, the exact solution is
+        an exponential relaxation towards the steady state of the interval:
+
+        .. math::
+            c_\mathrm{salt}(t) = c_\infty + (c_0 - c_\infty) \ e^{-\lambda (t - t_0)}
+
+        with :math:`\lambda = (A_\mathrm{wall} k_\mathrm{wall} + A_\mathrm{top} k_\mathrm{top}) / V`
+        and :math:`c_\infty = S / (\lambda V)`.
 
         Args:
             t_final (pint.Quantity): The final time of the simulation.
+            solver (str, optional): ``"analytic"`` to evaluate the exact solution,
+                otherwise the integration method passed to ``scipy.integrate.solve_ivp``.
+                Defaults to "BDF".
+            compiled (bool, optional): if True, the parameters are converted to SI
+                magnitudes once before the integration and the ODE is integrated
+                with a unit-free right-hand side (and its Jacobian for implicit
+                methods). If False, ``rhs`` is used. Defaults to True.
+            n_points (int, optional): the number of output times in each interval,
+                at least 2. Defaults to 1000.
+            resolution (pint.Quantity, optional): if provided, the maximum spacing
+                between output times, replacing ``n_points``. Defaults to None.
+            t_eval (pint.Quantity, optional): if provided, the results are only
+                stored at these times (e.g. the LSC sample times), sorted. The
+                concentration is zero before the first irradiation. Note that
+                ``integrated_release_top`` and ``integrated_release_wall``
+                integrate between the stored times. Defaults to None.
+            adaptive (bool, optional): if True, the output times of each interval
+                are spaced logarithmically from its start, with a spacing
+                proportional to the relaxation time :math:`1/\lambda` of the
+                model at the source switches. Defaults to False.
+            incremental (bool, optional): if True, the intervals already solved
+                by the previous ``run`` (same parameters, same intervals and same
+                options) are not solved again. Only the new intervals are solved,
+                starting from the concentration checkpointed at the end of the last
+                unchanged interval. This is useful when irradiations are appended to
+                ``irradiations`` or when ``t_final`` is extended. Defaults to False.
         """
-        concentration_units = ureg.particle * ureg.m**-3
-        time_units = ureg.s
-        initial_concentration = 0
+        if t_eval is not None and resolution is not None:
+            raise ValueError("Provide either t_eval or resolution, not both")
+        if t_eval is not None and incremental:
+            raise ValueError("t_eval cannot be used with incremental runs")
+
         time_intervals = self._generate_time_intervals(t_final)
+        t_starts, t_stops, sources = self._compile_intervals(time_intervals)
+        volume, g_wall, g_top = self._si_coefficients()
+
+        shape = np.shape(g_wall + g_top)
+        if t_eval is not None:
+            requested_times = np.sort(np.ravel(t_eval.to(ureg.s).magnitude))
+            if requested_times[0] < 0 or requested_times[-1] > t_stops[-1]:
+                raise ValueError(
+                    f"t_eval must be between 0 and the end of the simulation "
+                    f"({t_stops[-1]} s)"
+                )
+            times, concentrations = self._allocate_results(requested_times.size, shape)
+            times[:] = requested_times
+            # each distinct time after the start of the first irradiation is solved once
+            unique_times, inverse = np.unique(requested_times, return_inverse=True)
+            solved = unique_times >= t_starts[0]
+            solved_times = unique_times[solved]
+            solved_concentrations = np.empty(shape + solved_times.shape)
+            interval_index = _find_intervals(solved_times, t_stops)
+            first_interval = 0
+            settings = None
+        else:
+            if resolution is not None:
+                dt = resolution.to(ureg.s).magnitude
+                n_points = np.maximum(np.ceil((t_stops - t_starts) / dt), 1) + 1
+            n_points = np.broadcast_to(n_points, t_starts.shape).astype(int)
+            if np.any(n_points < 2):
+                raise ValueError(
+                    "n_points must be at least 2 (the start and stop of each interval)"
+                )
+            offsets = np.concatenate([[0], np.cumsum(n_points)])
+
+            relaxation_time = None
+            if adaptive:
+                relaxation_time = np.min(volume / (g_wall + g_top))
+
+            settings = [solver, compiled, relaxation_time]
+            settings += [volume, np.ravel(g_wall).tolist(), np.ravel(g_top).tolist()]
+            first_interval = 0
+            if incremental:
+                first_interval = self._first_new_interval(
+                    t_starts, t_stops, sources, n_points, settings
+                )
+
+            # the results of the unchanged intervals are kept in the buffers
+            times, concentrations = self._allocate_results(
+                offsets[-1], shape, keep=offsets[first_interval]
+            )
+            times = times[offsets[first_interval] :]
+            concentrations = concentrations[..., offsets[first_interval] :]
+            _, interval_index = _sample_intervals(
+                t_starts[first_interval:],
+                t_stops[first_interval:],
+                n_points[first_interval:],
+                relaxation_time,
+                out=times,
+            )
+            solved_times, solved_concentrations = times, concentrations
+
+        if first_interval > 0:
+            initial_concentration = self._checkpoints["concentrations"][
+                ..., first_interval - 1
+            ]
+        else:
+            initial_concentration = np.zeros(shape)
+        new_intervals = (
+            t_starts[first_interval:],
+            t_stops[first_interval:],
+            sources[..., first_interval:],
+        )
+
+        if solver == "analytic":
+            _piecewise_exponential(
+                solved_times,
+                interval_index,
+                *new_intervals,
+                volume,
+                g_wall + g_top,
+                initial_concentration,
+                out=solved_concentrations,
+            )
+            end_concentrations = _piecewise_exponential(
+                new_intervals[1],
+                np.arange(len(new_intervals[1])),
+                *new_intervals,
+                volume,
+                g_wall + g_top,
+                initial_concentration,
+            )
+        else:
+            end_concentrations = self._solve_numerical(
+                solved_times,
+                interval_index,
+                *new_intervals,
+                solver,
+                compiled,
+                initial_concentration,
+                out=solved_concentrations,
+            )
 
-        for interval in time_intervals:
-            t0 = interval[0].to(time_units).magnitude
-            tf = interval[1].to(time_units).magnitude
+        if t_eval is not None:
+            unique_concentrations = np.zeros(shape + unique_times.shape)
+            unique_concentrations[..., solved] = solved_concentrations
+            concentrations[...] = unique_concentrations[..., inverse]
+
+        # checkpoint the concentration at the end of each interval
+        if settings is None:
+            self._checkpoints = None
+        else:
+            if first_interval > 0:
+                previous = self._checkpoints["concentrations"][..., :first_interval]
+                end_concentrations = np.concatenate(
+                    [previous, end_concentrations], axis=-1
+                )
+            self._checkpoints = {
+                "settings": settings,
+                "t_starts": t_starts,
+                "t_stops": t_stops,
+                "sources": sources,
+                "n_points": n_points,
+                "concentrations": end_concentrations,
+            }
+
+        # the quantities are views on the buffers, without copies
+        n_times = offsets[-1] if t_eval is None else len(times)
+        self.times = ureg.Quantity(self._times_buffer[:n_times], ureg.s)
+        self.concentrations = ureg.Quantity(
+            self._concentrations_buffer[..., :n_times], ureg.particle * ureg.m**-3
+        )
 
+    def _first_new_interval(self, t_starts, t_stops, sources, n_points, settings):
+        """
+        Compares the intervals with the checkpoints of the previous run.
+
+        Args:
+            t_starts (np.ndarray): start times of the intervals (s)
+            t_stops (np.ndarray): stop times of the intervals (s)
+            sources (np.ndarray): source term on each interval (particle/s)
+            n_points (np.ndarray): the number of output times in each interval
+            settings (list): the parameters and options of the run
+
+        Returns:
+            int: the index of the first interval that was not solved by the
+            previous run
+        """
+        checkpoints = self._checkpoints
+        if checkpoints is None or checkpoints["settings"] != settings:
+            return 0
+        n = min(len(t_starts), len(checkpoints["t_starts"]))
+        unchanged = (
+            (t_starts[:n] == checkpoints["t_starts"][:n])
+            & (t_stops[:n] == checkpoints["t_stops"][:n])
+            & (n_points[:n] == checkpoints["n_points"][:n])
+            & np.all(
+                sources[..., :n] == checkpoints["sources"][..., :n],
+                axis=tuple(range(sources.ndim - 1)),
+            )
+        )
+        # number of leading unchanged intervals
+        return n if unchanged.all() else int(np.argmin(unchanged))
+
+    def _allocate_results(self, n_times, shape=(), keep=0):
+        """
+        Returns arrays to store the results of ``run`` in place.
+        The buffers of the previous run are reused when they are large enough.
+
+        Args:
+            n_times (int): the number of output times
+            shape (tuple, optional): the shape of the concentration at one
+                time. Defaults to ().
+            keep (int, optional): the number of results of the previous run
+                that are preserved if the buffers are reallocated. Defaults to 0.
+
+        Returns:
+            np.ndarray: array of ``n_times`` times
+            np.ndarray: array of concentrations with shape ``shape + (n_times,)``
+        """
+        buffer = self._concentrations_buffer
+        if buffer is None or buffer.shape[:-1] != shape:
+            capacity = n_times
+        elif buffer.shape[-1] < n_times:
+            # grow geometrically to amortise successive growths
+            capacity = max(n_times, int(1.5 * buffer.shape[-1]))
+        else:
+            capacity = None
+
+        if capacity is not None:
+            times_buffer = np.empty(capacity)
+            concentrations_buffer = np.empty(shape + (capacity,))
+            if keep > 0:
+                times_buffer[:keep] = self._times_buffer[:keep]
+                concentrations_buffer[..., :keep] = buffer[..., :keep]
+            self._times_buffer = times_buffer
+            self._concentrations_buffer = concentrations_buffer
+        return (
+            self._times_buffer[:n_times],
+            self._concentrations_buffer[..., :n_times],
+        )
+
+    def _solve_numerical(
+        self,
+        times,
+        interval_index,
+        t_starts,
+        t_stops,
+        sources,
+        solver,
+        compiled,
+        initial_concentration,
+        out,
+    ):
+        """
+        Integrates the ODE on each interval with ``scipy.integrate.solve_ivp``.
+        All the arguments are magnitudes in SI units.
+
+        Args:
+            times (np.ndarray): the output times (s)
+            interval_index (np.ndarray): the index of the interval of each output time
+            t_starts (np.ndarray): start times of the intervals (s)
+            t_stops (np.ndarray): stop times of the intervals (s)
+            sources (np.ndarray): source term on each interval (particle/s)
+            solver (str): the integration method
+            compiled (bool): if True, integrates a unit-free right-hand side,
+                otherwise uses ``rhs``
+            initial_concentration (np.ndarray): the concentration at the start
+                of the first interval (particle/m3)
+            out (np.ndarray): the array in which the concentrations at ``times``
+                are stored (particle/m3)
+
+        Returns:
+            np.ndarray: the concentration at the end of each interval (particle/m3)
+        """
+        volume, g_wall, g_top = self._si_coefficients()
+        bounds = np.searchsorted(interval_index, np.arange(len(t_starts) + 1))
+
+        end_concentrations = np.empty(np.shape(g_wall + g_top) + t_starts.shape)
+        initial_concentration = np.ravel(initial_concentration)
+        for i, (t0, tf) in enumerate(zip(t_starts, t_stops)):
+            if compiled:
+                fun, jac = _make_rhs(volume, g_wall + g_top, sources[..., i])
+                options = {"jac": jac} if solver in JACOBIAN_SOLVERS else {}
+            else:
+                fun, options = self.rhs, {}
+
+            # the end of the interval is always computed for the next interval
+            t_interval = times[bounds[i] : bounds[i + 1]]
+            if t_interval.size == 0 or t_interval[-1] != tf:
+                t_interval_eval = np.append(t_interval, tf)
+            else:
+                t_interval_eval = t_interval
             res = solve_ivp(
-                fun=self.rhs,
+                fun=fun,
                 t_span=(t0, tf),
-                y0=[initial_concentration],
-                t_eval=np.linspace(t0, tf, 1000),
+                y0=initial_concentration,
+                t_eval=t_interval_eval,
                 # method="RK45",  # RK45 doesn't catch the end of irradiations properly... unless constraining the max_step
                 # max_step=(0.5 * ureg.h).to(time_units).magnitude,
                 # method="Radau",
-                method="BDF",
+                method=solver,
+                **options,
+            )
+            results = out[..., bounds[i] : bounds[i + 1]]
+            results[...] = res.y[:, : t_interval.size].reshape(results.shape)
+            initial_concentration = res.y[:, -1]
+            end_concentrations[..., i] = initial_concentration.reshape(
+                end_concentrations.shape[:-1]
             )
-            self.times.append(res.t)
-            self.concentrations.append(res.y[0])
-            initial_concentration = res.y[0][-1]
 
-        self.times = np.concatenate(self.times) * time_units
-        self.concentrations = np.concatenate(self.concentrations) * concentration_units
+        return end_concentrations
 
     def reset(self):
         """
         Reset the model by resetting the ``concentrations`` and ``times``
         attributes to empty lists.
+        The memory allocated for the results is kept for the next ``run``.
         """
         self.concentrations = []
         self.times = []
+        self._checkpoints = None
 
     def integrated_release_top(self):
         """
@@ -314,6 +701,379 @@ class Model:
         return integrated_wall
 
 
+class ModelBatch(Model):
+    """
+    A batch of :class:`Model` sharing the same geometry, neutron rate and
+    irradiation schedule but with different ``TBR``, ``k_wall`` and ``k_top``.
+
+    All the models are solved at once as a vectorised system, which is much
+    faster than running each :class:`Model` separately for parametric scans.
+    ``TBR``, ``k_wall`` and ``k_top`` are broadcast against each other, so a
+    grid can be given with ``np.meshgrid`` followed by ``.ravel()``.
+
+    Args:
+        radius (pint.Quantity): radius of the salt
+        height (pint.Quantity): height of the salt
+        TBR (pint.Quantity): Tritium Breeding Ratios (scalar or 1D array)
+        neutron_rate (pint.Quantity): neutron rate
+        k_wall (pint.Quantity): mass transport coefficients for the
+            walls (scalar or 1D array)
+        k_top (pint.Quantity): mass transport coefficients for the
+            top surface (scalar or 1D array)
+        irradiations (list[tuple[pint.Quantity, pint.Quantity]]): list
+            of tuples with the start and stop times of irradiations
+
+    Attributes:
+        concentrations (pint.Quantity): concentrations with shape
+            ``(n_models, n_times)``
+        times (pint.Quantity): times shared by all the models
+    """
+
+    def __init__(
+        self,
+        radius: pint.Quantity,
+        height: pint.Quantity,
+        TBR: pint.Quantity,
+        neutron_rate: pint.Quantity,
+        k_wall: pint.Quantity,
+        k_top: pint.Quantity,
+        irradiations: list,
+    ) -> None:
+        size = np.broadcast_shapes(np.shape(TBR), np.shape(k_wall), np.shape(k_top))
+        ones = np.ones(size).ravel()
+        super().__init__(
+            radius=radius,
+            height=height,
+            TBR=TBR * ones,
+            neutron_rate=neutron_rate,
+            k_wall=k_wall * ones,
+            k_top=k_top * ones,
+            irradiations=irradiations,
+        )
+
+    def __len__(self):
+        return len(self.TBR)
+
+    def __getitem__(self, i) -> Model:
+        """
+        Returns the ``i``-th model of the batch as a :class:`Model`.
+        If the batch has been run, the results are copied to the model.
+        """
+        model = Model(
+            radius=self.radius,
+            height=self.height,
+            TBR=self.TBR[i],
+            neutron_rate=self.neutron_rate,
+            k_wall=self.k_wall[i],
+            k_top=self.k_top[i],
+            irradiations=self.irradiations,
+        )
+        model.L_wall = self.L_wall
+        if len(self.times) > 0:
+            # the results of the batch are views on buffers reused by its next run
+            model.times = self.times.copy()
+            model.concentrations = self.concentrations[i].copy()
+        return model
+
+    def _per_model(self, prm, c_salt):
+        # reshape a per-model parameter so that it broadcasts with c_salt
+        return prm.reshape((-1,) + (1,) * (np.ndim(c_salt) - 1))
+
+    def Q_wall(self, c_salt):
+        """
+        Calculate the release rate of tritium through the wall for each model.
+
+        Args:
+            c_salt (pint.Quantity): The concentration of tritium in the salt,
+                the first axis being the models.
+
+        Returns:
+            pint.Quantity: The release rate of tritium through the wall.
+        """
+        return self.A_wall * self._per_model(self.k_wall, c_salt) * c_salt
+
+    def Q_top(self, c_salt):
+        """
+        Calculate the release rate of tritium through the top surface for each model.
+
+        Args:
+            c_salt (pint.Quantity): The concentration of tritium in the salt,
+                the first axis being the models.
+
+        Returns:
+            pint.Quantity: The release rate of tritium through the top.
+        """
+        return self.A_top * self._per_model(self.k_top, c_salt) * c_salt
+
+    def run(self, t_final, solver: str = "analytic", **kwargs):
+        """
+        Solves the ODE of all the models between 0 and ``t_final``.
+        See :meth:`Model.run` for details.
+
+        Args:
+            t_final (pint.Quantity): The final time of the simulation.
+            solver (str, optional): ``"analytic"`` to evaluate the exact solution,
+                otherwise the integration method passed to ``scipy.integrate.solve_ivp``
+                for the whole system. Defaults to "analytic".
+            kwargs: other arguments of :meth:`Model.run`
+        """
+        super().run(t_final, solver=solver, **kwargs)
+
+
+def _find_intervals(times, t_stops):
+    """
+    Finds the interval of each time. Times at the boundary between two
+    intervals belong to the first one.
+
+    Args:
+        times (np.ndarray): the times (s)
+        t_stops (np.ndarray): stop times of the intervals (s)
+
+    Returns:
+        np.ndarray: the index of the interval of each time
+    """
+    return np.clip(np.searchsorted(t_stops, times, side="left"), 0, len(t_stops) - 1)
+
+
+def _sample_intervals(t_starts, t_stops, n_points, relaxation_time=None, out=None):
+    """
+    Generates output times on each interval, including both ends.
+
+    Args:
+        t_starts (np.ndarray): start times of the intervals (s)
+        t_stops (np.ndarray): stop times of the intervals (s)
+        n_points (int or np.ndarray): the number of times in each interval
+        relaxation_time (float, optional): if provided, the times are spaced
+            logarithmically from the start of each interval, starting with a
+            spacing of the order of ``relaxation_time / n_points`` (s).
+            Otherwise they are evenly spaced. Defaults to None.
+        out (np.ndarray, optional): the array in which the times are stored.
+            Defaults to None.
+
+    Returns:
+        np.ndarray: the times (s), stored in ``out`` if provided
+        np.ndarray: the index of the interval of each time
+    """
+    n_points = np.broadcast_to(n_points, t_starts.shape).astype(int)
+    interval_index = np.repeat(np.arange(len(t_starts)), n_points)
+
+    # position of each time in its interval, between 0 and 1
+    first = np.cumsum(n_points) - n_points
+    fraction = np.arange(interval_index.size) - first[interval_index]
+    fraction = fraction / (n_points - 1)[interval_index]
+
+    durations = (t_stops - t_starts)[interval_index]
+    if relaxation_time is None:
+        elapsed = fraction * durations
+    else:
+        # relaxation_time * ((1 + duration / relaxation_time)**fraction - 1)
+        elapsed = relaxation_time * np.expm1(
+            fraction * np.log1p(durations / relaxation_time)
+        )
+    times = np.add(t_starts[interval_index], elapsed, out=out)
+    return times, interval_index
+
+
+def _make_rhs(volume, conductance, source):
+    r"""
+    Builds the right-hand side of the ODE and its Jacobian as plain-float
+    closures for a constant source term.
+    All the arguments are magnitudes in SI units.
+
+    Args:
+        volume (float): volume of the salt (m3)
+        conductance (float or np.ndarray): total conductance
+            :math:`A_\mathrm{wall} k_\mathrm{wall} + A_\mathrm{top} k_\mathrm{top}` (m3/s).
+            If an array, each element is an independent model.
+        source (float or np.ndarray): source term (particle/s)
+
+    Returns:
+        callable: the rhs ``f(t, c)``
+        callable: the Jacobian ``J(t, c)`` (sparse for several models)
+    """
+    rate = conductance / volume
+    production = source / volume
+    if np.size(rate) == 1:
+        jacobian = np.array([[-np.ravel(rate)[0]]])
+    else:
+        jacobian = diags(-rate)
+
+    def rhs(t, c):
+        return production - rate * c
+
+    def jac(t, c):
+        return jacobian
+
+    return rhs, jac
+
+
+def _piecewise_exponential(
+    times,
+    interval_index,
+    t_starts,
+    t_stops,
+    sources,
+    volume,
+    conductance,
+    initial_concentration=0.0,
+    out=None,
+):
+    r"""
+    Exact solution of :math:`V \frac{dc}{dt} = S_i - G c` for a source
+    :math:`S_i` that is constant on each interval:
+
+    .. math::
+        c(t) = c_0 + (c_0 - c_\infty) \ (e^{-\lambda \Delta t} - 1)
+
+    with :math:`\lambda = G / V` and :math:`c_\infty = S_i / G`, which is
+    accurate for small conductances and tends to :math:`c_0 + S_i \Delta t / V`
+    for :math:`G = 0`.
+    All the arguments are magnitudes in SI units.
+
+    Args:
+        times (np.ndarray): the times at which the solution is evaluated (s)
+        interval_index (np.ndarray): the index of the interval each time belongs to
+        t_starts (np.ndarray): start times of the intervals (s)
+        t_stops (np.ndarray): stop times of the intervals (s)
+        sources (np.ndarray): source term on each interval (particle/s),
+            the last axis being the intervals
+        volume (float): volume of the salt (m3)
+        conductance (float or np.ndarray): total conductance :math:`G` (m3/s).
+            If an array, each element is an independent model.
+        initial_concentration (float or np.ndarray, optional): concentration
+            at the start of the first interval (particle/m3). Defaults to 0.
+        out (np.ndarray, optional): the array in which the concentrations are
+            stored. Defaults to None.
+
+    Returns:
+        np.ndarray: the concentrations at ``times`` (particle/m3), with shape
+        ``conductance.shape + times.shape``
+    """
+    rate = np.asarray(conductance)[..., None] / volume
+    production = sources / volume
+    initial_concentrations = _initial_concentrations(
+        rate, production, t_stops - t_starts, initial_concentration
+    )
+
+    no_release = rate == 0
+    steady_state = production / np.where(no_release, 1.0, rate)
+
+    # c_0 + (c_0 - c_inf) * expm1(-rate * (t - t_0)), computed in place
+    elapsed = times - t_starts[interval_index]
+    concentrations = np.multiply(-rate, elapsed, out=out)
+    np.expm1(concentrations, out=concentrations)
+    concentrations *= (initial_concentrations - steady_state)[..., interval_index]
+    concentrations += initial_concentrations[..., interval_index]
+    if np.any(no_release):
+        accumulated = (
+            initial_concentrations[..., interval_index]
+            + production[..., interval_index] * elapsed
+        )
+        np.copyto(concentrations, accumulated, where=no_release)
+    return concentrations
+
+
+def _phi1(x):
+    r"""
+    :math:`\varphi_1(x) = (1 - e^{-x}) / x`, with :math:`\varphi_1(0) = 1`
+    """
+    x = np.asarray(x)
+    zero = x == 0
+    x_safe = np.where(zero, 1.0, x)
+    return np.where(zero, 1.0, -np.expm1(-x_safe) / x_safe)
+
+
+def _phi2(x):
+    r"""
+    :math:`\varphi_2(x) = (x - 1 + e^{-x}) / x^2`, with :math:`\varphi_2(0) = 1/2`
+    """
+    x = np.asarray(x)
+    # Taylor series where the closed form cancels
+    small = np.abs(x) < 1e-3
+    x_safe = np.where(small, 1.0, x)
+    series = 1 / 2 - x / 6 + x**2 / 24 - x**3 / 120
+    return np.where(small, series, (x_safe + np.expm1(-x_safe)) / x_safe**2)
+
+
+def _initial_concentrations(rate, production, durations, initial_concentration):
+    r"""
+    Propagates the exact solution from one interval to the next.
+
+    Args:
+        rate (np.ndarray): :math:`\lambda = G / V` (1/s)
+        production (np.ndarray): :math:`S_i / V` on each interval (particle/m3/s)
+        durations (np.ndarray): durations of the intervals (s)
+        initial_concentration (float or np.ndarray): concentration at the
+            start of the first interval
+
+    Returns:
+        np.ndarray: the concentration at the start of each interval
+    """
+    x = rate * durations
+    decays = np.exp(-x)
+    increments = production * durations * _phi1(x)
+    initial_concentrations = np.empty(
+        np.broadcast_shapes(decays.shape, increments.shape),
+        dtype=np.result_type(decays, increments, initial_concentration),
+    )
+    concentration = initial_concentration
+    for i in range(initial_concentrations.shape[-1]):
+        initial_concentrations[..., i] = concentration
+        concentration = concentration * decays[..., i] + increments[..., i]
+    return initial_concentrations
+
+
+def _piecewise_exponential_integral(
+    times,
+    interval_index,
+    t_starts,
+    t_stops,
+    sources,
+    volume,
+    conductance,
+    initial_concentration=0.0,
+):
+    r"""
+    Time integral of the exact solution computed by ``_piecewise_exponential``
+    between the start of the first interval and ``times``:
+
+    .. math::
+        \int_0^{\Delta t} c \ dt = c_0 \ \Delta t \ \varphi_1(\lambda \Delta t)
+        + \frac{S_i}{V} \ \Delta t^2 \ \varphi_2(\lambda \Delta t)
+
+    Multiplying it by a conductance gives the cumulative release through the
+    corresponding surface.
+
+    Args:
+        see ``_piecewise_exponential``
+
+    Returns:
+        np.ndarray: :math:`\int c_\mathrm{salt} \ dt` at ``times`` (particle.s/m3),
+        with shape ``conductance.shape + times.shape``
+    """
+    rate = np.asarray(conductance)[..., None] / volume
+    production = sources / volume
+    durations = t_stops - t_starts
+    initial_concentrations = _initial_concentrations(
+        rate, production, durations, initial_concentration
+    )
+
+    def integral(c0, production, elapsed):
+        x = rate * elapsed
+        return c0 * elapsed * _phi1(x) + production * elapsed**2 * _phi2(x)
+
+    # integral over each full interval, accumulated to the start of each interval
+    interval_integrals = integral(initial_concentrations, production, durations)
+    initial_integrals = np.cumsum(interval_integrals, axis=-1) - interval_integrals
+
+    elapsed = times - t_starts[interval_index]
+    return initial_integrals[..., interval_index] + integral(
+        initial_concentrations[..., interval_index],
+        production[..., interval_index],
+        elapsed,
+    )
+
+
 def quantity_to_activity(Q):
     """Converts a quantity of tritium to activity.
     By multiplying the quantity by the specific activity and molar mass of tritium.
@@ -223,23 +223,48 @@ def plot_bars_old(measurements, index=None, bar_width=0.35, stacked=True):
 
 
 def replace_water(sample_activity, time, replacement_times):
-    sample_activity_changed = np.copy(sample_activity)
-    times_changed = np.copy(time)
-
-    for replacement_time in sorted(replacement_times):
-        indices = np.where(times_changed > replacement_time)
-        # at each replacement, make the sample activity drop to zero
-        sample_activity_changed[indices] -= sample_activity_changed[indices][0]
-
-        # insert nan value to induce a line break in plots
-        if indices[0].size > 0:
-            first_index = indices[0][0]
-            sample_activity_changed = np.insert(
-                sample_activity_changed, first_index, np.nan * ureg.Bq
-            )
-            times_changed = np.insert(times_changed, first_index, np.nan * ureg.day)
+    """
+    Makes the sample activity drop to zero at each replacement of the water
+    and inserts NaN values at the replacements to induce line breaks in plots.
+
+    All the segments are found at once with ``np.searchsorted`` and the outputs
+    are filled in a single pass. Replacements after the last time are ignored.
+
+    Args:
+        sample_activity (pint.Quantity): the activity of the sample at each time
+        time (pint.Quantity): the times, in increasing order
+        replacement_times (list[pint.Quantity]): the times of the water replacements
+
+    Returns:
+        pint.Quantity: the sample activity, with a NaN value at each replacement
+        pint.Quantity: the times, with a NaN value at each replacement
+    """
+    activity = np.asarray(sample_activity.magnitude, dtype=float)
+    times = np.asarray(time.magnitude, dtype=float)
+    replacements = np.sort(
+        [ureg.Quantity(t).to(time.units).magnitude for t in replacement_times]
+    )
 
-    return sample_activity_changed, times_changed
+    # index of the first time after each replacement
+    starts = np.searchsorted(times, replacements, side="right")
+    starts = starts[starts < len(times)]
+
+    # at each replacement, make the sample activity drop to zero
+    samples = np.arange(len(times))
+    segments = np.searchsorted(starts, samples, side="right")
+    drops = np.concatenate([[0.0], activity[starts]])
+
+    # one nan value before the first time of each segment
+    positions = samples + segments
+    activity_changed = np.full(len(times) + len(starts), np.nan)
+    times_changed = np.full(len(times) + len(starts), np.nan)
+    activity_changed[positions] = activity - drops[segments]
+    times_changed[positions] = times
+
+    return (
+        ureg.Quantity(activity_changed, sample_activity.units),
+        ureg.Quantity(times_changed, time.units),
+    )
 
 
 def plot_sample_activity_top(
@@ -0,0 +1,146 @@
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import pint
+
+from libra_toolbox.tritium import ureg
+from libra_toolbox.tritium.model import Model
+
+RESULTS = {
+    "times": ureg.s,
+    "concentrations": ureg.particle * ureg.m**-3,
+    "integrated_release_top": ureg.particle,
+    "integrated_release_wall": ureg.particle,
+}
+
+
+def run_scan(
+    parameters: dict,
+    grid: dict,
+    t_final: pint.Quantity,
+    workers: int | None = None,
+    chunksize: int | None = None,
+    **kwargs,
+) -> pd.DataFrame:
+    """
+    Runs a :class:`Model` for every combination of the parameters in ``grid``
+    and collects the results in a ``pandas.DataFrame``.
+
+    The models are run in parallel with a ``concurrent.futures.ProcessPoolExecutor``.
+    Quantities are sent to the workers as magnitudes and units, since
+    quantities of ``libra_toolbox.tritium.ureg`` cannot be unpickled by
+    another registry.
+
+    Example:
+
+    .. code-block:: python
+
+        results = run_scan(
+            parameters=dict(radius=..., height=..., TBR=..., k_top=..., k_wall=..., irradiations=...),
+            grid=dict(neutron_rate=[1e8, 2e8, 5e8] * ureg.neutron * ureg.s**-1),
+            t_final=7 * ureg.day,
+        )
+
+    Args:
+        parameters (dict): the arguments of :class:`Model` that are fixed
+        grid (dict): the arguments of :class:`Model` that are scanned, each
+            with a list of values. All the combinations are run.
+        t_final (pint.Quantity): the final time of the simulations
+        workers (int, optional): the number of processes. If 1, the models
+            are run in the current process. Defaults to ``os.cpu_count()``.
+        chunksize (int, optional): the number of models run by a worker per task.
+            Defaults to a quarter of the number of models per worker.
+        kwargs: other arguments passed to :meth:`Model.run`
+
+    Returns:
+        pandas.DataFrame: one row per model, with the scanned parameters and
+        the ``times``, ``concentrations``, ``integrated_release_top`` and
+        ``integrated_release_wall`` of each model as pint.Quantity objects
+    """
+    names = list(grid.keys())
+    combinations = list(itertools.product(*[list(grid[name]) for name in names]))
+    tasks = [
+        (_dump({**parameters, **dict(zip(names, values))}), _dump(t_final), kwargs)
+        for values in combinations
+    ]
+
+    if workers is None:
+        workers = os.cpu_count()
+    if workers == 1:
+        outputs = [_run_configuration(task) for task in tasks]
+    else:
+        if chunksize is None:
+            chunksize = max(1, len(tasks) // (4 * workers))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            outputs = list(executor.map(_run_configuration, tasks, chunksize=chunksize))
+
+    columns = {}
+    for i, name in enumerate(names):
+        columns[name] = _object_array([values[i] for values in combinations])
+    for name, units in RESULTS.items():
+        columns[name] = _object_array(
+            [ureg.Quantity(output[name], units) for output in outputs]
+        )
+    return pd.DataFrame(columns)
+
+
+def _run_configuration(task):
+    """
+    Runs a model in a worker.
+
+    Args:
+        task (tuple): the serialised arguments of the model, the serialised
+            final time and the arguments of ``Model.run``
+
+    Returns:
+        dict: the results as magnitudes in the units of ``RESULTS``
+    """
+    parameters, t_final, kwargs = task
+    model = Model(**_load(parameters))
+    model.run(_load(t_final), **kwargs)
+    results = {
+        "times": model.times,
+        "concentrations": model.concentrations,
+        "integrated_release_top": model.integrated_release_top(),
+        "integrated_release_wall": model.integrated_release_wall(),
+    }
+    return {
+        name: np.asarray(results[name].to(units).magnitude)
+        for name, units in RESULTS.items()
+    }
+
+
+def _dump(value):
+    """Replaces the quantities in (nested) arguments by (magnitude, units) tuples"""
+    if isinstance(value, pint.Quantity):
+        return (_QuantityTag, value.magnitude, str(value.units))
+    if isinstance(value, dict):
+        return {key: _dump(val) for key, val in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(_dump(val) for val in value)
+    return value
+
+
+def _load(value):
+    """Inverse of ``_dump``"""
+    if isinstance(value, tuple) and len(value) == 3 and value[0] is _QuantityTag:
+        return ureg.Quantity(value[1], value[2])
+    if isinstance(value, dict):
+        return {key: _load(val) for key, val in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(_load(val) for val in value)
+    return value
+
+
+class _QuantityTag:
+    """Marker of serialised quantities"""
+
+
+def _object_array(values):
+    # pandas would otherwise try to convert the quantities to arrays
+    array = np.empty(len(values), dtype=object)
+    for i, value in enumerate(values):
+        array[i] = value
+    return array
@@ -0,0 +1,118 @@
+import numpy as np
+import pytest
+
+from libra_toolbox.neutron_detection.diamond.coincidence import *
+from libra_toolbox.neutron_detection.diamond.process_data import DataProcessor
+
+
+def random_times(n, seed):
+    rng = np.random.default_rng(seed)
+    return np.sort(rng.uniform(0, 1, size=n))
+
+
+@pytest.mark.parametrize("resolving_time", [0, 1e-4, 1e-3])
+def test_find_pileup_matches_loop(resolving_time):
+    time_values = random_times(2000, seed=0)
+    # some events at exactly the same time
+    time_values[100:103] = time_values[100]
+
+    pileup = find_pileup(time_values, resolving_time)
+
+    for i, t in enumerate(time_values):
+        others = np.delete(time_values, i)
+        assert pileup[i] == np.any(np.abs(others - t) <= resolving_time)
+
+
+def test_find_pileup_empty():
+    assert len(find_pileup(np.array([]), 1e-3)) == 0
+    assert not find_pileup(np.array([1.0]), 1e-3)[0]
+
+
+def test_find_coincidences_matches_loop():
+    resolving_time = 1e-3
+    time_values = [random_times(500, seed=i) for i in range(3)]
+
+    coincidences = find_coincidences(time_values, resolving_time)
+
+    assert len(coincidences) == 3
+    for i, detector_time_values in enumerate(time_values):
+        others = np.concatenate(time_values[:i] + time_values[i + 1 :])
+        for t, in_coincidence in zip(detector_time_values, coincidences[i]):
+            assert in_coincidence == np.any(np.abs(others - t) <= resolving_time)
+
+
+def test_coincidence_pairs_matches_loop():
+    resolving_time = 2e-3
+    time_values = random_times(300, seed=1)
+    other_time_values = random_times(400, seed=2)
+
+    indices, other_indices = coincidence_pairs(
+        time_values, other_time_values, resolving_time
+    )
+
+    expected = [
+        (i, j)
+        for i, t in enumerate(time_values)
+        for j, other_t in enumerate(other_time_values)
+        if abs(t - other_t) <= resolving_time
+    ]
+    assert list(zip(indices, other_indices)) == expected
+    assert np.array_equal(
+        np.bincount(indices, minlength=len(time_values)),
+        count_coincidences(time_values, other_time_values, resolving_time),
+    )
+
+
+@pytest.mark.parametrize("model", ["non-paralyzable", "paralyzable"])
+def test_dead_time_correction_inverts_model(model):
+    dead_time = 1e-6
+    true_rates = np.array([0, 1e3, 1e5, 5e5])
+    if model == "non-paralyzable":
+        measured_rates = true_rates / (1 + true_rates * dead_time)
+    else:
+        measured_rates = true_rates * np.exp(-true_rates * dead_time)
+
+    corrected_rates = correct_dead_time(measured_rates, dead_time, model=model)
+
+    assert np.allclose(corrected_rates, true_rates)
+
+
+def test_dead_time_correction_above_maximum_rate():
+    dead_time = 1e-6
+    assert np.isnan(non_paralyzable_correction(2e6, dead_time))
+    assert np.isnan(paralyzable_correction(1 / (2 * dead_time), dead_time))
+
+
+def test_correct_dead_time_unknown_model():
+    with pytest.raises(ValueError):
+        correct_dead_time([1.0], 1e-6, model="unknown")
+
+
+@pytest.mark.parametrize("model", ["non-paralyzable", "paralyzable"])
+def test_get_count_rates_dead_time(model):
+    rng = np.random.default_rng(0)
+    processor = DataProcessor()
+    processor.time_values = np.sort(rng.uniform(0, 10, size=5000))
+    processor.energy_values = rng.uniform(0, 10, size=5000)
+    dead_time = 1e-4
+    energy_windows = [None, (2, 5)]
+
+    count_rates, count_rate_errors, bins = processor.get_count_rates(
+        1, energy_windows=energy_windows
+    )
+    corrected_rates, corrected_errors, corrected_bins = processor.get_count_rates(
+        1, energy_windows=energy_windows, dead_time=dead_time, dead_time_model=model
+    )
+
+    assert np.array_equal(corrected_bins, bins)
+    expected_total = correct_dead_time(count_rates[0], dead_time, model=model)
+    assert np.allclose(corrected_rates[0], expected_total)
+    correction = expected_total / count_rates[0]
+    assert np.all(correction > 1)
+    assert np.allclose(corrected_rates[1], count_rates[1] * correction)
+    assert np.allclose(corrected_errors, count_rate_errors * correction)
+
+    count_rate, _ = processor.get_count_rate(
+        1, energy_window=(2, 5), dead_time=dead_time, dead_time_model=model
+    )
+    assert np.array_equal(count_rate, corrected_rates[1])
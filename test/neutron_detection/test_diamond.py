@@ -1,4 +1,9 @@
+import os
 from libra_toolbox.neutron_detection.diamond.process_data import *
+from libra_toolbox.neutron_detection.diamond.process_data import (
+    _cumulative_counts,
+    _cumulative_histogram,
+)
 import pytest
 
 
@@ -158,3 +163,674 @@ def test_count_rate_doesnt_ignore_data():
 
     # the first time bin should be -100
     assert np.isclose(time_bins[0], -100)
+
+
+@pytest.mark.parametrize("delimiter", [None, ";"])
+@pytest.mark.parametrize("chunksize", [1, 7, 1000])
+def test_add_file_streaming_matches_genfromtxt(tmpdir, delimiter, chunksize):
+    """Checks that the chunked reader gives the same values as np.genfromtxt"""
+    data = np.random.rand(50, 4) * 1e12
+    filename = str(tmpdir.join("data.txt"))
+    np.savetxt(
+        filename,
+        data,
+        delimiter=" " if delimiter is None else delimiter,
+        header="BOARD CHANNEL TIMETAG ENERGY",
+    )
+
+    processor = DataProcessor()
+    processor.add_file(
+        filename,
+        time_column=3,
+        energy_column=1,
+        delimiter=delimiter,
+        skip_header=1,
+        chunksize=chunksize,
+    )
+
+    expected = np.genfromtxt(filename, delimiter=delimiter, skip_header=1)
+    inds = np.argsort(expected[:, 3])
+    assert np.array_equal(processor.time_values, expected[inds, 3] * (1 / 1e12))
+    assert np.array_equal(processor.energy_values, expected[inds, 1])
+
+
+def test_read_columns_single_row(tmpdir):
+    filename = str(tmpdir.join("data.csv"))
+    np.savetxt(filename, [[1.0, 2.0, 3.0]], delimiter=",")
+
+    values = read_columns(filename, [2, 0], delimiter=",")
+
+    assert np.array_equal(values, [[3.0], [1.0]])
+
+
+def test_add_file_genfromtxt_fallback(tmpdir):
+    """Checks that other arguments of np.genfromtxt are still supported"""
+    data = np.random.rand(10, 2)
+    filename = str(tmpdir.join("data.csv"))
+    np.savetxt(filename, data, delimiter=",")
+
+    processor = DataProcessor()
+    processor.add_file(
+        filename,
+        time_column=0,
+        energy_column=1,
+        delimiter=",",
+        max_rows=5,
+        scale_time=False,
+    )
+
+    assert np.array_equal(processor.time_values, np.sort(data[:5, 0]))
+
+
+def write_events(filename, time_values, energy_values):
+    np.savetxt(filename, np.column_stack((time_values, energy_values)), delimiter=",")
+    return filename
+
+
+@pytest.mark.parametrize("monotonic", [True, False])
+def test_add_file_merges_sorted_events(tmpdir, monotonic):
+    """Checks that the merged events are the same as sorting all the events"""
+    rng = np.random.default_rng(42)
+    all_times = []
+    all_energies = []
+    processor = DataProcessor()
+    for i in range(4):
+        # overlapping files, with some times shared between files
+        times = rng.integers(0, 50, size=30).astype(float)
+        if monotonic:
+            times = np.sort(times)
+        energies = rng.random(30)
+        filename = write_events(str(tmpdir.join(f"file{i}.csv")), times, energies)
+        processor.add_file(
+            filename, time_column=0, energy_column=1, delimiter=",", scale_time=False
+        )
+        all_times.append(times)
+        all_energies.append(energies)
+
+    all_times = np.concatenate(all_times)
+    all_energies = np.concatenate(all_energies)
+    inds = np.argsort(all_times, kind="stable")
+    assert np.array_equal(processor.time_values, all_times[inds])
+    assert np.array_equal(processor.energy_values, all_energies[inds])
+
+
+def test_add_files_matches_add_file(tmpdir):
+    rng = np.random.default_rng(0)
+    filenames = [
+        write_events(str(tmpdir.join(f"file{i}.csv")), rng.random(20), rng.random(20))
+        for i in range(3)
+    ]
+
+    processor_files = DataProcessor()
+    processor_files.add_files(filenames, time_column=0, energy_column=1, delimiter=",")
+    processor_file = DataProcessor()
+    for filename in filenames:
+        processor_file.add_file(filename, time_column=0, energy_column=1, delimiter=",")
+
+    assert processor_files.files == filenames
+    assert np.all(np.diff(processor_files.time_values) >= 0)
+    assert np.array_equal(processor_files.time_values, processor_file.time_values)
+    assert np.array_equal(processor_files.energy_values, processor_file.energy_values)
+
+
+def test_add_file_sorts_values_set_directly(tmpdir):
+    """Checks that events set directly are sorted before merging"""
+    filename = write_events(str(tmpdir.join("file.csv")), [2.5, 0.5], [25, 5])
+    processor = DataProcessor()
+    processor.time_values = np.array([3.0, 1.0, 2.0])
+    processor.energy_values = np.array([30.0, 10.0, 20.0])
+
+    processor.add_file(
+        filename, time_column=0, energy_column=1, delimiter=",", scale_time=False
+    )
+
+    assert np.array_equal(processor.time_values, [0.5, 1, 2, 2.5, 3])
+    assert np.array_equal(processor.energy_values, [5, 10, 20, 25, 30])
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_save_load(tmpdir, mmap):
+    filename = write_events(str(tmpdir.join("file.csv")), [3.0, 1.0, 2.0], [3, 1, 2])
+    processor = DataProcessor()
+    processor.add_file(filename, time_column=0, energy_column=1, delimiter=",")
+
+    processor.save(str(tmpdir.join("saved")))
+    loaded = DataProcessor.load(str(tmpdir.join("saved")), mmap=mmap)
+
+    assert loaded.files == [filename]
+    assert isinstance(loaded.time_values, np.memmap) == mmap
+    assert np.array_equal(loaded.time_values, processor.time_values)
+    assert np.array_equal(loaded.energy_values, processor.energy_values)
+
+
+def test_load_does_not_sort(tmpdir, monkeypatch):
+    """Checks that the saved events are sorted and that queries after a
+    memory-mapped load do not read all of them to check it"""
+    processor = DataProcessor()
+    processor.time_values = np.array([3.0, 1.0, 2.0, 5.0])
+    processor.energy_values = np.array([3.0, 1.0, 2.0, 5.0])
+    processor.save(str(tmpdir.join("saved")))
+
+    def fail(*args):
+        raise AssertionError("the events are sorted again")
+
+    monkeypatch.setattr(
+        "libra_toolbox.neutron_detection.diamond.process_data._sort_events", fail
+    )
+    loaded = DataProcessor.load(str(tmpdir.join("saved")), mmap=True)
+
+    assert np.array_equal(loaded.time_values, [1, 2, 3, 5])
+    assert np.array_equal(loaded.energy_values, [1, 2, 3, 5])
+    assert loaded.get_avg_rate(1.5, 4.5) == (2 / 3, np.sqrt(2) / 3)
+    loaded.get_count_rate(1)
+
+
+def test_load_unsorted_save(tmpdir):
+    """Checks that events saved without the sorted flag are still sorted"""
+    path = tmpdir.mkdir("saved")
+    np.save(str(path.join("time_values.npy")), np.array([3.0, 1.0, 2.0]))
+    np.save(str(path.join("energy_values.npy")), np.array([3.0, 1.0, 2.0]))
+    with open(str(path.join("files.json")), "w") as f:
+        f.write('{"files": []}')
+
+    loaded = DataProcessor.load(str(path))
+
+    assert loaded.get_avg_rate(0.5, 2.5)[0] == 1
+
+
+def test_add_file_after_load(tmpdir):
+    """Checks that files can be added to a memory-mapped data processor"""
+    filename1 = write_events(str(tmpdir.join("file1.csv")), [1.0, 3.0], [1, 3])
+    filename2 = write_events(str(tmpdir.join("file2.csv")), [2.0], [2])
+    processor = DataProcessor()
+    processor.add_file(
+        filename1, time_column=0, energy_column=1, delimiter=",", scale_time=False
+    )
+    processor.save(str(tmpdir.join("saved")))
+
+    loaded = DataProcessor.load(str(tmpdir.join("saved")))
+    loaded.add_file(
+        filename2, time_column=0, energy_column=1, delimiter=",", scale_time=False
+    )
+
+    assert loaded.files == [filename1, filename2]
+    assert np.array_equal(loaded.time_values, [1, 2, 3])
+
+
+def test_parse_cache(tmpdir, monkeypatch):
+    """Checks that the files are only parsed again when they change"""
+    import libra_toolbox.neutron_detection.diamond.process_data as process_data
+
+    calls = []
+    read_events = process_data.read_events
+    monkeypatch.setattr(
+        process_data,
+        "read_events",
+        lambda *args, **kwargs: calls.append(args[0]) or read_events(*args, **kwargs),
+    )
+    filename = write_events(str(tmpdir.join("file.csv")), [1.0, 2.0], [10, 20])
+    cache_dir = str(tmpdir.join("cache"))
+
+    def add(**kwargs):
+        processor = DataProcessor(cache_dir=cache_dir)
+        processor.add_file(filename, time_column=0, energy_column=1, **kwargs)
+        return processor
+
+    first = add(delimiter=",")
+    second = add(delimiter=",")
+    assert len(calls) == 1
+    assert np.array_equal(first.time_values, second.time_values)
+    assert np.array_equal(first.energy_values, second.energy_values)
+
+    # other parsing options
+    add(delimiter=",", scale_time=False)
+    assert len(calls) == 2
+
+    # modified file
+    write_events(filename, [1.0, 2.0, 3.0], [10, 20, 30])
+    os.utime(filename, ns=(0, 10**9))
+    third = add(delimiter=",")
+    assert len(calls) == 3
+    assert len(third.time_values) == 3
+
+
+def make_processor(n=2000, seed=0):
+    # integer times and energies so that many events are on the bounds
+    rng = np.random.default_rng(seed)
+    processor = DataProcessor()
+    processor.time_values = np.sort(rng.integers(0, 100, size=n)).astype(float)
+    processor.energy_values = rng.integers(0, 20, size=n).astype(float)
+    return processor
+
+
+ENERGY_WINDOWS = [None, (2, 8), (5, 15), (0, 20), (8, 9), (7, 7), (10, 3), (-1, np.inf)]
+
+
+def test_get_count_rates_matches_masks():
+    """Checks the single pass count rates against masks for each energy window"""
+    processor = make_processor()
+    bin_time = 7
+
+    count_rates, count_rate_errors, bins = processor.get_count_rates(
+        bin_time, energy_windows=ENERGY_WINDOWS
+    )
+
+    assert count_rates.shape == (len(ENERGY_WINDOWS), len(bins) - 1)
+    for i, window in enumerate(ENERGY_WINDOWS):
+        time_values = processor.time_values
+        if window is not None:
+            energy_values = processor.energy_values
+            mask = (energy_values > window[0]) & (energy_values < window[1])
+            time_values = time_values[mask]
+        expected, expected_bins = np.histogram(time_values, bins=bins)
+        assert np.array_equal(count_rates[i], expected / bin_time)
+        assert np.array_equal(count_rate_errors[i], np.sqrt(expected) / bin_time)
+
+        count_rate, count_rate_bins = processor.get_count_rate(bin_time, window)
+        assert np.array_equal(count_rate, count_rates[i])
+        assert np.array_equal(count_rate_bins, bins)
+
+
+def test_get_avg_rates_matches_masks():
+    """Checks the single pass average rates against masks for each window"""
+    processor = make_processor()
+    time_windows = [(10, 20), (15.5, 60), (0, 100), (30, 31), (50, 40), (-5, 3)]
+
+    count_rates, count_rate_errors = processor.get_avg_rates(
+        time_windows, energy_windows=ENERGY_WINDOWS
+    )
+
+    assert count_rates.shape == (len(time_windows), len(ENERGY_WINDOWS))
+    time_values = processor.time_values
+    energy_values = processor.energy_values
+    for i, (t_min, t_max) in enumerate(time_windows):
+        for j, window in enumerate(ENERGY_WINDOWS):
+            mask = (time_values > t_min) & (time_values < t_max)
+            if window is not None:
+                mask &= (energy_values > window[0]) & (energy_values < window[1])
+            counts = np.count_nonzero(mask)
+            assert count_rates[i, j] == counts / (t_max - t_min)
+            assert count_rate_errors[i, j] == np.sqrt(counts) / (t_max - t_min)
+
+
+def test_get_count_rate_unsorted_values():
+    """Checks that values set directly in any order are sorted"""
+    processor = make_processor()
+    sorted_rates, _ = processor.get_count_rate(5, energy_window=(2, 8))
+
+    inds = np.random.default_rng(1).permutation(len(processor.time_values))
+    processor.time_values = processor.time_values[inds]
+    processor.energy_values = processor.energy_values[inds]
+    rates, _ = processor.get_count_rate(5, energy_window=(2, 8))
+
+    assert np.array_equal(rates, sorted_rates)
+
+
+def test_energy_index_matches_single_pass(monkeypatch):
+    """Checks that indexed windows give the same rates without a pass over the events"""
+    import libra_toolbox.neutron_detection.diamond.process_data as process_data
+
+    processor = make_processor()
+    time_windows = [(10, 20), (15.5, 60), (0, 100), (50, 40)]
+    expected_avg = processor.get_avg_rates(time_windows, ENERGY_WINDOWS)
+    expected_bins = processor.get_count_rates(7, ENERGY_WINDOWS)
+
+    processor.build_energy_index(ENERGY_WINDOWS)
+
+    def single_pass(*args):
+        raise AssertionError("the events should not be scanned")
+
+    monkeypatch.setattr(process_data, "_cumulative_counts", single_pass)
+    avg = processor.get_avg_rates(time_windows, ENERGY_WINDOWS)
+    bins = processor.get_count_rates(7, ENERGY_WINDOWS)
+    for expected, values in zip(expected_avg + expected_bins, avg + bins):
+        assert np.array_equal(expected, values)
+    assert processor.get_avg_rate(10, 20, (2, 8))[0] == expected_avg[0][0, 1]
+
+
+@pytest.mark.parametrize("chunksize", [1, 7, 100, CHUNKSIZE])
+def test_cumulative_counts_chunks(chunksize):
+    """Checks the counts between positions against masks, for positions that
+    do not start at the first event and with repeated positions"""
+    energy_values = make_processor().energy_values
+    positions = np.array([150, 150, 151, 300, 420, 420, 1999])
+
+    counts = _cumulative_counts(energy_values, positions, ENERGY_WINDOWS, chunksize)
+
+    for i, window in enumerate(ENERGY_WINDOWS):
+        in_window = np.ones(len(energy_values), dtype=bool)
+        if window is not None:
+            in_window = (energy_values > window[0]) & (energy_values < window[1])
+        expected = [np.sum(in_window[positions[0] : p]) for p in positions]
+        assert np.array_equal(counts[i], expected)
+
+
+@pytest.mark.parametrize("chunksize", [1, 7, 100, CHUNKSIZE])
+def test_cumulative_histogram_chunks(chunksize):
+    """Checks the histograms before positions against np.histogram,
+    with repeated positions and energies on the bin edges"""
+    energy_values = np.round(make_processor().energy_values)
+    bins = np.linspace(2, 8, num=7)
+    positions = np.array([0, 150, 150, 151, 300, 420, 420, 1999])
+
+    cumulative = _cumulative_histogram(energy_values, bins, positions, chunksize)
+
+    expected = [np.histogram(energy_values[:p], bins)[0] for p in positions]
+    assert np.array_equal(cumulative, expected)
+
+
+def test_windowed_query_scans_only_window(monkeypatch):
+    """Checks that a time window query without energy index only reads the
+    energies of the events in the window"""
+    processor = make_processor()
+    time_values = processor.time_values
+    expected = processor.get_avg_rate(30, 31, (2, 8))
+
+    class Energies(np.ndarray):
+        def __getitem__(self, item):
+            assert isinstance(item, slice)
+            assert item.stop - item.start == np.sum(
+                (time_values > 30) & (time_values < 31)
+            )
+            return super().__getitem__(item)
+
+    processor.energy_values = processor.energy_values.view(Energies)
+    processor._sorted_cache = (
+        processor.time_values,
+        processor.energy_values,
+        processor.time_values,
+        processor.energy_values,
+    )
+    assert processor.get_avg_rate(30, 31, (2, 8)) == expected
+
+
+def test_energy_index_discarded_when_events_change(tmpdir):
+    processor = make_processor()
+    processor.build_energy_index([(2, 8)])
+    filename = write_events(str(tmpdir.join("file.csv")), [15.0] * 10, [5.0] * 10)
+
+    processor.add_file(
+        filename, time_column=0, energy_column=1, delimiter=",", scale_time=False
+    )
+    rate, _ = processor.get_avg_rate(10, 20, energy_window=(2, 8))
+
+    time_values = processor.time_values
+    energy_values = processor.energy_values
+    mask = (time_values > 10) & (time_values < 20)
+    mask &= (energy_values > 2) & (energy_values < 8)
+    assert rate == np.count_nonzero(mask) / 10
+
+
+def test_get_time_energy_histogram_matches_histogram2d():
+    processor = make_processor()
+    time_bins = np.linspace(0, 99, num=12)
+    energy_bins = [0, 2, 5, 5.5, 10, 19]
+
+    counts, time_edges, energy_edges = processor.get_time_energy_histogram(
+        time_bins, energy_bins
+    )
+
+    expected, expected_time_edges, expected_energy_edges = np.histogram2d(
+        processor.time_values, processor.energy_values, bins=[time_bins, energy_bins]
+    )
+    assert np.array_equal(counts, expected)
+    assert np.array_equal(time_edges, expected_time_edges)
+    assert np.array_equal(energy_edges, expected_energy_edges)
+
+    counts, _, _ = processor.get_time_energy_histogram(10, 7)
+    expected, _, _ = np.histogram2d(
+        processor.time_values, processor.energy_values, bins=[10, 7]
+    )
+    assert np.array_equal(counts, expected)
+
+
+TIME_WINDOWS = [None, (10, 20), (15.5, 60), (0, 100), (30, 31), (50, 40), (-5, 3)]
+
+
+@pytest.mark.parametrize("bins", [7, [0, 2, 5, 5.5, 10, 19]])
+@pytest.mark.parametrize("indexed", [False, True])
+def test_get_energy_spectrum(bins, indexed):
+    """Checks the spectra against np.histogram, with or without spectrum index"""
+    processor = make_processor()
+    if indexed:
+        processor.build_spectrum_index(bins, time_step=6)
+
+    for time_window in TIME_WINDOWS:
+        spectrum, edges = processor.get_energy_spectrum(bins, time_window=time_window)
+
+        mask = np.ones(len(processor.time_values), dtype=bool)
+        if time_window is not None:
+            mask = (processor.time_values > time_window[0]) & (
+                processor.time_values < time_window[1]
+            )
+        expected, expected_edges = np.histogram(
+            processor.energy_values[mask],
+            bins=np.histogram_bin_edges(processor.energy_values, bins),
+        )
+        assert np.array_equal(spectrum, expected)
+        assert np.array_equal(edges, expected_edges)
+
+
+def test_spectrum_index_not_used_for_other_bins():
+    processor = make_processor()
+    processor.build_spectrum_index(5, time_step=10)
+
+    spectrum, _ = processor.get_energy_spectrum(4)
+    assert len(spectrum) == 4
+
+    # the index is discarded when the events change
+    processor.time_values = processor.time_values + 1
+    spectrum, _ = processor.get_energy_spectrum(5, time_window=(50, 60))
+    mask = (processor.time_values > 50) & (processor.time_values < 60)
+    expected, _ = np.histogram(
+        processor.energy_values[mask],
+        bins=np.histogram_bin_edges(processor.energy_values, 5),
+    )
+    assert np.array_equal(spectrum, expected)
+
+
+def append_lines(filename, text):
+    with open(filename, "a") as f:
+        f.write(text)
+
+
+def test_follow_file(tmpdir):
+    """Checks that only the complete lines appended to a followed file are read"""
+    filename = str(tmpdir.join("acquisition.csv"))
+    append_lines(filename, "TIMETAG;ENERGY\n1;10\n3;30\n5;5")
+
+    processor = DataProcessor()
+    processor.add_file(
+        filename,
+        time_column=0,
+        energy_column=1,
+        delimiter=";",
+        skip_header=1,
+        scale_time=False,
+        follow=True,
+    )
+    assert np.array_equal(processor.time_values, [1, 3])
+    first_time_values = processor.time_values
+
+    assert processor.update() == 0
+
+    # the last line is completed and more lines are appended
+    append_lines(filename, "0;50\n2;20\n4;")
+    assert processor.update() == 2
+    assert np.array_equal(processor.time_values, [1, 2, 3, 5])
+    assert np.array_equal(processor.energy_values, [10, 20, 30, 50])
+
+    append_lines(filename, "40\n6;60\n")
+    assert processor.update() == 2
+    assert np.array_equal(processor.time_values, [1, 2, 3, 4, 5, 6])
+    assert np.array_equal(processor.energy_values, [10, 20, 30, 40, 50, 60])
+
+    # the arrays returned before are not modified
+    assert np.array_equal(first_time_values, [1, 3])
+    assert processor.files == [filename]
+
+
+def test_follow_file_incomplete_header(tmpdir):
+    filename = str(tmpdir.join("acquisition.csv"))
+    append_lines(filename, "TIME")
+
+    processor = DataProcessor()
+    processor.add_file(
+        filename, 0, 1, delimiter=";", skip_header=1, scale_time=False, follow=True
+    )
+    assert len(processor.time_values) == 0
+
+    append_lines(filename, "TAG;ENERGY\n1;10\n")
+    assert processor.update() == 1
+    assert np.array_equal(processor.time_values, [1])
+
+
+def test_follow_file_small_blocks(tmpdir):
+    """Checks that lines split between blocks are read once"""
+    from libra_toolbox.neutron_detection.diamond.process_data import _FollowedFile
+
+    filename = str(tmpdir.join("acquisition.txt"))
+    data = np.random.rand(20, 2)
+    np.savetxt(filename, data)
+
+    followed_file = _FollowedFile(filename, 0, 1, scale_time=False)
+    time_values, energy_values = followed_file.read_new_events(blocksize=7)
+
+    assert np.array_equal(time_values, data[:, 0])
+    assert np.array_equal(energy_values, data[:, 1])
+
+
+def test_follow_file_unsupported_arguments(tmpdir):
+    filename = write_events(str(tmpdir.join("file.csv")), [1.0], [1.0])
+
+    with pytest.raises(ValueError):
+        DataProcessor().add_file(filename, 0, 1, max_rows=1, follow=True)
+
+
+def test_running_count_rate(tmpdir):
+    """Checks that a running count rate is updated with the new events"""
+    filename = str(tmpdir.join("acquisition.csv"))
+    append_lines(filename, "0.5,5\n1.5,15\n")
+    processor = DataProcessor()
+    processor.add_file(filename, 0, 1, delimiter=",", scale_time=False, follow=True)
+
+    count_rate = processor.track_count_rate(bin_time=2, t_start=0)
+    peak_rate = processor.track_count_rate(bin_time=2, energy_window=(10, 100))
+    assert np.array_equal(count_rate.counts, [2])
+    assert np.array_equal(peak_rate.counts, [1])
+
+    append_lines(filename, "2.5,25\n7,70\n3,3\n")
+    processor.update()
+
+    assert np.array_equal(count_rate.counts, [2, 2, 0, 1])
+    assert np.array_equal(count_rate.bins, [0, 2, 4, 6, 8])
+    assert np.array_equal(count_rate.count_rates, [1, 1, 0, 0.5])
+    assert np.array_equal(peak_rate.bins, [0.5, 2.5, 4.5, 6.5, 8.5])
+    assert np.array_equal(peak_rate.counts, [1, 1, 0, 1])
+
+
+def test_compact_storage(tmpdir):
+    """Checks that compact mode keeps exact picosecond timestamps"""
+    # timestamps of a long run, beyond the exact integers of float64
+    time_values_ps = 2**60 + np.array([7, 3, 5, 1], dtype=np.int64)
+    energy_values = np.array([700, 300, 500, 100])
+    filename = str(tmpdir.join("data.csv"))
+    np.savetxt(
+        filename,
+        np.column_stack((time_values_ps, energy_values)),
+        fmt="%d",
+        delimiter=",",
+    )
+
+    processor = DataProcessor(compact=True, energy_dtype=np.uint16)
+    processor.add_file(filename, time_column=0, energy_column=1, delimiter=",")
+
+    assert processor.time_values.dtype == np.int64
+    assert processor.energy_values.dtype == np.uint16
+    assert np.array_equal(processor.time_values, np.sort(time_values_ps))
+    assert np.array_equal(processor.energy_values, [100, 300, 500, 700])
+    assert np.allclose(processor.get_time_values(), np.sort(time_values_ps) * 1e-12)
+
+
+@pytest.mark.parametrize("energy_dtype", [np.float32, np.uint16])
+def test_compact_matches_default(tmpdir, energy_dtype):
+    """Checks that the rates and histograms are the same in compact mode"""
+    rng = np.random.default_rng(3)
+    time_values_ps = rng.integers(0, 100 * 10**12, size=3000)
+    energy_values = rng.integers(0, 20, size=3000)
+    filename = str(tmpdir.join("data.csv"))
+    np.savetxt(
+        filename,
+        np.column_stack((time_values_ps, energy_values)),
+        fmt="%d",
+        delimiter=",",
+    )
+
+    processor = DataProcessor()
+    compact = DataProcessor(compact=True, energy_dtype=energy_dtype)
+    for p in [processor, compact]:
+        p.add_file(filename, time_column=0, energy_column=1, delimiter=",")
+
+    time_windows = [(10, 20), (15.5, 60), (0, 100)]
+    for expected, values in [
+        (processor.get_count_rate(7, (2, 8)), compact.get_count_rate(7, (2, 8))),
+        (
+            processor.get_avg_rates(time_windows, ENERGY_WINDOWS),
+            compact.get_avg_rates(time_windows, ENERGY_WINDOWS),
+        ),
+        (
+            processor.get_time_energy_histogram(10, [0, 5, 10, 20]),
+            compact.get_time_energy_histogram(10, [0, 5, 10, 20]),
+        ),
+        (
+            processor.get_energy_spectrum(5, (10, 20)),
+            compact.get_energy_spectrum(5, (10, 20)),
+        ),
+    ]:
+        for expected_array, array in zip(expected, values):
+            assert np.allclose(expected_array, array)
+
+
+def test_compact_save_load(tmpdir):
+    processor = DataProcessor(compact=True, energy_dtype=np.uint16)
+    processor.time_values = np.array([1, 2, 3], dtype=np.int64)
+    processor.energy_values = np.array([10, 20, 30], dtype=np.uint16)
+
+    processor.save(str(tmpdir.join("saved")))
+    loaded = DataProcessor.load(str(tmpdir.join("saved")))
+
+    assert loaded.compact
+    assert loaded.energy_dtype == np.uint16
+    assert np.array_equal(loaded.get_time_values(), [1e-12, 2e-12, 3e-12])
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_add_files_parallel_matches_serial(tmpdir, compact):
+    rng = np.random.default_rng(5)
+    filenames = []
+    for i in range(5):
+        # overlapping files, some sorted, with times shared between files
+        times = rng.integers(0, 10**6, size=200)
+        if i % 2:
+            times = np.sort(times)
+        filename = str(tmpdir.join(f"file{i}.csv"))
+        np.savetxt(
+            filename,
+            np.column_stack((times, rng.integers(0, 100, size=200))),
+            fmt="%d",
+            delimiter=",",
+        )
+        filenames.append(filename)
+
+    serial = DataProcessor(compact=compact)
+    serial.add_files(filenames, time_column=0, energy_column=1, delimiter=",")
+    parallel = DataProcessor(compact=compact)
+    parallel.add_files(
+        filenames, time_column=0, energy_column=1, delimiter=",", workers=2
+    )
+
+    assert parallel.files == filenames
+    assert np.all(np.diff(parallel.time_values) >= 0)
+    assert np.array_equal(parallel.time_values, serial.time_values)
+    assert np.array_equal(parallel.energy_values, serial.energy_values)
+    assert parallel.energy_values.dtype == serial.energy_values.dtype
@@ -0,0 +1,157 @@
+from libra_toolbox.tritium.model import Model, quantity_to_activity, ureg
+from libra_toolbox.tritium.fitting import fit_model, cumulative_release
+from libra_toolbox.tritium.lsc_measurements import LSCSample, LIBRASample, GasStream
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+
+
+def make_model(k_top, k_wall):
+    return Model(
+        radius=1 * ureg.inch,
+        height=3 * ureg.inch,
+        TBR=5e-4 * ureg.particle * ureg.neutron**-1,
+        k_top=k_top,
+        k_wall=k_wall,
+        irradiations=[
+            (0 * ureg.hour, 12 * ureg.hour),
+            (24 * ureg.hour, 36 * ureg.hour),
+        ],
+        neutron_rate=3e8 * ureg.neutron * ureg.s**-1,
+    )
+
+
+def make_stream(model, sample_times, release="top"):
+    """Makes a GasStream whose cumulative activity is the release of the model"""
+    cumulative = quantity_to_activity(
+        cumulative_release(model, sample_times, release)
+    ).to(ureg.Bq)
+    activities = np.diff(cumulative.magnitude, prepend=0)
+
+    start_time = datetime(2024, 7, 29, 9, 0)
+    samples = []
+    for time, activity in zip(sample_times, activities):
+        vials = [LSCSample(activity * ureg.Bq, "vial")] + [
+            LSCSample(0 * ureg.Bq, "vial") for _ in range(3)
+        ]
+        for vial in vials:
+            vial.background_substracted = True
+        sample_time = start_time + timedelta(seconds=float(time.to(ureg.s).magnitude))
+        samples.append(LIBRASample(vials, sample_time))
+    return GasStream(samples, start_time)
+
+
+def test_cumulative_release_matches_run():
+    """Checks that the exact cumulative release matches the one from Model.run"""
+    model = make_model(
+        k_top=5e-6 * ureg.m * ureg.s**-1, k_wall=3e-8 * ureg.m * ureg.s**-1
+    )
+    model.run(7 * ureg.day, solver="analytic")
+
+    times = np.array([0.5, 1, 2, 5, 7]) * ureg.day
+    for release, reference in [
+        ("top", model.integrated_release_top()),
+        ("wall", model.integrated_release_wall()),
+    ]:
+        computed = cumulative_release(model, times, release)
+        expected = np.interp(
+            times.to(ureg.s).magnitude,
+            model.times.to(ureg.s).magnitude,
+            reference.to(ureg.particle).magnitude,
+        )
+        assert np.allclose(computed.to(ureg.particle).magnitude, expected, rtol=1e-3)
+
+
+def test_cumulative_release_before_irradiation():
+    """Checks that nothing is released at sample times before the first irradiation"""
+    model = make_model(
+        k_top=5e-6 * ureg.m * ureg.s**-1, k_wall=3e-8 * ureg.m * ureg.s**-1
+    )
+    model.irradiations = [(10 * ureg.hour, 20 * ureg.hour)]
+    model.run(2 * ureg.day, solver="analytic")
+
+    times = np.array([2, 5, 15, 30, 48]) * ureg.hour
+    computed = cumulative_release(model, times).to(ureg.particle).magnitude
+
+    assert np.all(computed[:2] == 0)
+    expected = np.interp(
+        times[2:].to(ureg.s).magnitude,
+        model.times.to(ureg.s).magnitude,
+        model.integrated_release_top().to(ureg.particle).magnitude,
+    )
+    assert np.allclose(computed[2:], expected, rtol=1e-3)
+
+
+def test_fit_sample_before_irradiation():
+    """Checks the fit when the stream starts before the first irradiation"""
+    true_model = make_model(
+        k_top=5e-6 * ureg.m * ureg.s**-1, k_wall=3e-8 * ureg.m * ureg.s**-1
+    )
+    true_model.irradiations = [
+        (6 * ureg.hour, 18 * ureg.hour),
+        (30 * ureg.hour, 42 * ureg.hour),
+    ]
+    sample_times = np.array([1, 3, 12, 24, 48, 72, 120, 168]) * ureg.hour
+    stream = make_stream(true_model, sample_times)
+    assert np.all(stream.get_cumulative_activity().magnitude[:2] == 0)
+
+    guess = make_model(
+        k_top=1e-6 * ureg.m * ureg.s**-1, k_wall=3e-8 * ureg.m * ureg.s**-1
+    )
+    guess.irradiations = true_model.irradiations
+    result = fit_model(guess, stream, parameters=["k_top"])
+
+    assert result.success
+    assert np.isclose(result.parameters["k_top"], true_model.k_top, rtol=1e-4)
+    assert np.allclose(result.residuals.magnitude[:2], 0)
+
+
+def test_fit_recovers_parameters():
+    """Builds measurements from a known model and checks the fit recovers
+    k_top and k_wall from another initial guess"""
+    k_top = 5e-6 * ureg.m * ureg.s**-1
+    k_wall = 3e-8 * ureg.m * ureg.s**-1
+    sample_times = np.array([0.5, 1, 1.5, 2, 3, 4, 6]) * ureg.day
+    true_model = make_model(k_top, k_wall)
+    streams = [
+        make_stream(true_model, sample_times, "top"),
+        make_stream(true_model, sample_times, "wall"),
+    ]
+
+    initial_guess = make_model(2 * k_top, 0.5 * k_wall)
+    result = fit_model(initial_guess, streams, releases=["top", "wall"])
+
+    assert result.success
+    assert np.isclose(result.parameters["k_top"], k_top, rtol=1e-4)
+    assert np.isclose(result.parameters["k_wall"], k_wall, rtol=1e-4)
+    assert result.covariance.shape == (2, 2)
+    assert result.std["k_top"].units == k_top.units
+    assert np.allclose(result.residuals.magnitude, 0, atol=1e-6)
+    assert result.model.k_top == result.parameters["k_top"]
+    # the initial model is left untouched
+    assert initial_guess.k_top == 2 * k_top
+
+
+def test_fit_wrong_parameter():
+    model = make_model(
+        k_top=5e-6 * ureg.m * ureg.s**-1, k_wall=3e-8 * ureg.m * ureg.s**-1
+    )
+    stream = make_stream(model, np.array([1.0, 2.0]) * ureg.day)
+    with pytest.raises(ValueError, match="Cannot fit radius"):
+        fit_model(model, stream, parameters=["radius"])
+
+
+def test_fit_zero_initial_value():
+    """Checks that a parameter starting at zero, which a scaling factor
+    cannot move, is rejected"""
+    model = make_model(
+        k_top=5e-6 * ureg.m * ureg.s**-1, k_wall=3e-8 * ureg.m * ureg.s**-1
+    )
+    stream = make_stream(model, np.array([1.0, 2.0]) * ureg.day)
+    model.k_wall = 0 * ureg.m * ureg.s**-1
+    with pytest.raises(ValueError, match="initial value of k_wall"):
+        fit_model(model, stream)
+
+    # not fitted, so it may be zero
+    result = fit_model(model, stream, parameters=("k_top",))
+    assert result.parameters["k_top"].magnitude > 0
@@ -1,7 +1,13 @@
 import pytest
+import numpy as np
 import pint
 from datetime import datetime
-from libra_toolbox.tritium.lsc_measurements import GasStream, LIBRASample, LSCSample
+from libra_toolbox.tritium.lsc_measurements import (
+    GasStream,
+    LIBRARun,
+    LIBRASample,
+    LSCSample,
+)
 from libra_toolbox.tritium.model import ureg
 
 
@@ -81,3 +87,173 @@ def test_relative_times():
         datetime.strptime("01/03/2023 12:00 PM", "%m/%d/%Y %I:%M %p")
         - datetime.strptime(start_time, "%m/%d/%Y %I:%M %p"),
     ]
+
+
+def make_stream():
+    rng = np.random.default_rng(0)
+    samples = []
+    for i in range(20):
+        n_vials = 4 if i % 3 else 3
+        vials = [
+            LSCSample(value * ureg.Bq, f"{i}-{j}")
+            for j, value in enumerate(rng.uniform(1, 10, size=n_vials))
+        ]
+        samples.append(LIBRASample(vials, datetime(2023, 1, 1 + i, 12)))
+    return GasStream(samples, datetime(2023, 1, 1))
+
+
+@pytest.mark.parametrize("form", ["total", "soluble", "insoluble"])
+def test_get_activity_matches_samples(form):
+    stream = make_stream()
+    for sample in stream.samples:
+        sample.substract_background(LSCSample(0.5 * ureg.Bq, "background"))
+
+    activity = stream.get_activity(form)
+    cumulative_activity = stream.get_cumulative_activity(form)
+
+    expected = ureg.Quantity.from_list(
+        [getattr(sample, f"get_{form}_activity")() for sample in stream.samples]
+    )
+    assert np.allclose(activity.to(ureg.Bq).magnitude, expected.magnitude)
+    assert np.allclose(
+        cumulative_activity.to(ureg.Bq).magnitude, expected.cumsum().magnitude
+    )
+
+
+def test_activities_array():
+    stream = make_stream()
+
+    activities = stream.activities
+
+    assert activities.shape == (20, 4)
+    assert activities.units == ureg.Bq
+    for i, sample in enumerate(stream.samples):
+        for j, lsc_sample in enumerate(sample.samples):
+            assert activities[i, j] == lsc_sample.activity
+        # padded with zeros
+        assert np.all(activities[i, len(sample.samples) :].magnitude == 0)
+
+
+def test_activities_updated_after_background_substraction():
+    stream = make_stream()
+    before = stream.activities
+
+    stream.samples[0].substract_background(LSCSample(0.5 * ureg.Bq, "background"))
+
+    after = stream.activities
+    # the first sample has 3 vials, all above the background
+    assert np.allclose(after[0, :3].magnitude, before[0, :3].magnitude - 0.5)
+    assert after[0, 3].magnitude == 0
+    assert np.array_equal(after[1:].magnitude, before[1:].magnitude)
+
+
+def test_activities_converted_to_bq():
+    sample = LSCSample(1 * ureg.kBq, "Sample1")
+    sample.background_substracted = True
+    stream = GasStream(
+        [LIBRASample([sample], "01/02/2023 12:00 PM")], "01/01/2023 12:00 PM"
+    )
+
+    assert stream.get_cumulative_activity().magnitude.tolist() == [1000]
+    assert stream.get_cumulative_activity().units == ureg.Bq
+
+
+def test_stream_substract_background_matches_samples():
+    """Checks the vectorised background substraction against the per-sample path"""
+    stream = make_stream()
+    expected_stream = make_stream()
+    background = LSCSample(2 * ureg.Bq, "background")
+
+    with pytest.warns(UserWarning):
+        stream.substract_background(background)
+    with pytest.warns(UserWarning):
+        for sample in expected_stream.samples:
+            sample.substract_background(background)
+
+    assert np.allclose(
+        stream.activities.magnitude, expected_stream.activities.magnitude
+    )
+    assert all(
+        lsc_sample.background_substracted
+        for sample in stream.samples
+        for lsc_sample in sample.samples
+    )
+
+
+@pytest.mark.parametrize("per_vial", [False, True])
+def test_stream_substract_time_dependent_background(per_vial):
+    stream = make_stream()
+    before = stream.activities.magnitude
+    background = np.linspace(0, 1, len(stream.samples))
+    if per_vial:
+        background = np.repeat(background[:, None], 4, axis=1)
+
+    with pytest.warns(UserWarning):
+        stream.substract_background(background * ureg.kBq)
+
+    after = stream.activities.magnitude
+    expected = np.clip(before - 1000 * background.reshape(len(before), -1), 0, None)
+    is_vial = before > 0
+    assert np.allclose(after[is_vial], expected[is_vial])
+    assert np.all(after[~is_vial] == 0)
+
+
+def test_stream_substract_background_per_file():
+    stream = make_stream()
+    for i, sample in enumerate(stream.samples):
+        for lsc_sample in sample.samples:
+            lsc_sample.origin_file = f"file_{i % 2}.csv"
+    before = stream.activities.magnitude
+    background = {"file_0.csv": 1 * ureg.Bq, "file_1.csv": LSCSample(2 * ureg.Bq, "b")}
+
+    with pytest.warns(UserWarning):
+        stream.substract_background(background)
+
+    after = stream.activities.magnitude
+    offsets = np.where(np.arange(len(before)) % 2 == 0, 1, 2)[:, None]
+    expected = np.clip(before - offsets, 0, None)
+    is_vial = before > 0
+    assert np.allclose(after[is_vial], expected[is_vial])
+
+    stream.samples[0].samples[0].origin_file = "unknown.csv"
+    for sample in stream.samples:
+        for lsc_sample in sample.samples:
+            lsc_sample.background_substracted = False
+    with pytest.raises(ValueError, match="No background"):
+        stream.substract_background(background)
+
+
+def test_run_substract_background_single_warning():
+    streams = [make_stream(), make_stream()]
+    run = LIBRARun(streams, datetime(2023, 1, 1))
+
+    with pytest.warns(UserWarning) as record:
+        run.substract_background([5 * ureg.Bq, 8 * ureg.Bq])
+
+    assert len(record) == 1
+    assert "are negative after substracting background" in str(record[0].message)
+    for stream in streams:
+        assert np.all(stream.activities.magnitude >= 0)
+    assert all(
+        lsc_sample.background_substracted
+        for stream in streams
+        for sample in stream.samples
+        for lsc_sample in sample.samples
+    )
+
+
+def test_run_substract_background_already_substracted():
+    streams = [make_stream(), make_stream()]
+    run = LIBRARun(streams, datetime(2023, 1, 1))
+    streams[1].samples[3].samples[0].background_substracted = True
+    before = streams[0].activities.magnitude
+
+    with pytest.raises(ValueError, match="Background already substracted"):
+        run.substract_background(1 * ureg.Bq)
+
+    # nothing is substracted
+    assert np.array_equal(streams[0].activities.magnitude, before)
+    assert not streams[0].samples[0].samples[0].background_substracted
+
+    with pytest.raises(ValueError, match="one background per gas stream"):
+        run.substract_background([1 * ureg.Bq])
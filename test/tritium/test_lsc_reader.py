@@ -1,4 +1,12 @@
-from libra_toolbox.tritium.lsc_measurements import LSCFileReader
+from libra_toolbox.tritium import lsc_measurements
+from libra_toolbox.tritium.lsc_measurements import (
+    LSCFileReader,
+    LSCSample,
+    read_lsc_files,
+)
+import pandas as pd
+import pytest
+import shutil
 
 from pathlib import Path
 
@@ -57,3 +65,246 @@ def test_read_quench_set():
     csv_reader.read_file()
 
     assert csv_reader.quench_set == "Low Energy: 3H-UG"
+
+
+def test_read_file_matches_two_pass_read():
+    """Checks the single pass reader against reading the header and the data separately"""
+    filename = Path(__file__).parent / "test_lsc_file_with_labels.csv"
+
+    csv_reader = LSCFileReader(filename, labels_column="SMPL_ID")
+    csv_reader.read_file()
+
+    with open(filename, "r") as file:
+        lines = file.readlines()
+    start = next(i for i, line in enumerate(lines) if line.startswith("S#"))
+    expected_data = pd.read_csv(filename, skiprows=start)
+
+    assert csv_reader.header_content == "".join(lines[:start])
+    pd.testing.assert_frame_equal(csv_reader.data, expected_data)
+
+
+def test_read_file_only_used_columns():
+    """Checks that only the used columns are loaded with only_used_columns"""
+    filename = Path(__file__).parent / "test_lsc_file_with_labels.csv"
+
+    full_reader = LSCFileReader(filename, labels_column="SMPL_ID")
+    full_reader.read_file()
+    csv_reader = LSCFileReader(filename, labels_column="SMPL_ID")
+    csv_reader.read_file(only_used_columns=True)
+
+    assert sorted(csv_reader.data.columns) == sorted(
+        ["SMPL_ID", "Count Time", "Bq:1", "LUM"]
+    )
+    pd.testing.assert_frame_equal(
+        csv_reader.data, full_reader.data[csv_reader.data.columns]
+    )
+    assert csv_reader.quench_set == "Low Energy: 3H-UG"
+
+
+def test_read_file_only_used_columns_no_last_column_warning(tmpdir, recwarn):
+    """Checks that an empty used column that is not the last column of the file
+    does not trigger the warning about the last column"""
+    filename = Path(__file__).parent / "test_lsc_file_with_labels.csv"
+    with open(filename, "r") as f:
+        lines = f.readlines()
+    start = next(i for i, line in enumerate(lines) if line.startswith("S#"))
+    data = pd.read_csv(filename, skiprows=start)
+    # the empty MESSAGES column is the last used column, but not the last column
+    columns = [column for column in data.columns if column not in ("MESSAGES", "CPMA")]
+    data = data[columns + ["MESSAGES", "CPMA"]]
+    reordered = str(tmpdir / "reordered.csv")
+    with open(reordered, "w") as f:
+        f.writelines(lines[:start])
+        data.to_csv(f, index=False)
+
+    csv_reader = LSCFileReader(reordered, labels_column="MESSAGES")
+    csv_reader.read_file(only_used_columns=True, use_cache=False)
+
+    assert csv_reader.data.columns[-1] == "MESSAGES"
+    assert not any("last column" in str(w.message) for w in recwarn)
+
+
+TEST_CSV_LABELS = [
+    "1-1-1",
+    "1-1-2",
+    "1-1-3",
+    "1-1-4",
+    None,
+    "1-2-1",
+    "1-2-2",
+    "1-2-3",
+    "1-2-4",
+    None,
+    "1-3-1",
+    "1-3-2",
+    "1-3-3",
+    "1-3-4",
+]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_read_lsc_files(tmpdir, workers):
+    """Checks the table of a directory of LSC files against LSCFileReader"""
+    for name in ["TEST_CSV.csv", "test_lsc_file_with_labels.csv"]:
+        shutil.copy(Path(__file__).parent / name, tmpdir / name)
+
+    table = read_lsc_files(
+        str(tmpdir),
+        vial_labels={"TEST_CSV.csv": TEST_CSV_LABELS},
+        labels_column="SMPL_ID",
+        workers=workers,
+    )
+
+    readers = [
+        LSCFileReader(str(tmpdir / "TEST_CSV.csv"), vial_labels=TEST_CSV_LABELS),
+        LSCFileReader(
+            str(tmpdir / "test_lsc_file_with_labels.csv"), labels_column="SMPL_ID"
+        ),
+    ]
+    assert len(table) == 12 + 9
+    for reader in readers:
+        reader.read_file()
+        for label, value in reader.get_bq1_values_with_labels().items():
+            if pd.isna(label):
+                continue
+            row = table.loc[(reader.file_path, label)]
+            assert row["activity"] == value
+            assert row["quench_set"] == reader.quench_set
+            assert row["header_content"] == reader.header_content
+
+
+def test_read_lsc_files_glob(tmpdir):
+    shutil.copy(
+        Path(__file__).parent / "test_lsc_file_with_labels.csv",
+        tmpdir / "test_lsc_file_with_labels.csv",
+    )
+
+    table = read_lsc_files(str(tmpdir / "*.csv"), labels_column="SMPL_ID")
+    assert table.index.names == ["file", "label"]
+    assert len(table) == 9
+
+    with pytest.raises(FileNotFoundError):
+        read_lsc_files(str(tmpdir / "*.txt"), labels_column="SMPL_ID")
+
+
+def test_lsc_sample_from_table():
+    """Checks LSCSample.from_table against LSCSample.from_file"""
+    filename = str(Path(__file__).parent / "test_lsc_file_with_labels.csv")
+    reader = LSCFileReader(filename, labels_column="SMPL_ID")
+    reader.read_file()
+
+    samples = LSCSample.from_table(reader.to_table())
+
+    assert len(samples) == 9
+    for (file, label), sample in samples.items():
+        expected = LSCSample.from_file(reader, label)
+        assert file == filename
+        assert sample.name == label
+        assert sample.activity == expected.activity
+        assert sample.origin_file == expected.origin_file
+
+
+@pytest.fixture
+def lsc_file(tmpdir):
+    """A copy of a LSC file, with an empty cache"""
+    filename = str(tmpdir / "test_lsc_file_with_labels.csv")
+    shutil.copy(Path(__file__).parent / "test_lsc_file_with_labels.csv", filename)
+    lsc_measurements.clear_cache()
+    yield filename
+    lsc_measurements.clear_cache()
+
+
+def count_parses(monkeypatch):
+    calls = []
+    parse = LSCFileReader._parse
+
+    def counting_parse(self, *args, **kwargs):
+        calls.append(self.file_path)
+        return parse(self, *args, **kwargs)
+
+    monkeypatch.setattr(LSCFileReader, "_parse", counting_parse)
+    return calls
+
+
+def test_read_file_cache(lsc_file, monkeypatch):
+    calls = count_parses(monkeypatch)
+
+    first = LSCFileReader(lsc_file, labels_column="SMPL_ID")
+    first.read_file()
+    second = LSCFileReader(lsc_file, labels_column="SMPL_ID")
+    second.read_file()
+
+    assert len(calls) == 1
+    pd.testing.assert_frame_equal(first.data, second.data)
+    assert second.header_content == first.header_content
+    assert second.quench_set == first.quench_set
+    assert second.vial_labels == first.vial_labels
+
+    # the cached data is not shared
+    first.data.loc[0, "Bq:1"] = -1
+    third = LSCFileReader(lsc_file, labels_column="SMPL_ID")
+    third.read_file()
+    assert third.data.loc[0, "Bq:1"] == second.data.loc[0, "Bq:1"]
+
+    # other columns or no cache
+    LSCFileReader(lsc_file, labels_column="SMPL_ID").read_file(only_used_columns=True)
+    LSCFileReader(lsc_file, labels_column="SMPL_ID").read_file(use_cache=False)
+    assert len(calls) == 3
+
+
+def test_read_file_cache_invalidated_when_file_changes(lsc_file, monkeypatch):
+    calls = count_parses(monkeypatch)
+    reader = LSCFileReader(lsc_file, labels_column="SMPL_ID")
+    reader.read_file()
+
+    with open(lsc_file, "r") as f:
+        content = f.read()
+    with open(lsc_file, "w") as f:
+        f.write(content.replace("Low Energy: 3H-UG", "Low Energy: 3H"))
+    reader = LSCFileReader(lsc_file, labels_column="SMPL_ID")
+    reader.read_file()
+
+    assert len(calls) == 2
+    assert reader.quench_set == "Low Energy: 3H"
+
+
+def test_read_file_cache_lru_eviction(tmpdir, lsc_file, monkeypatch):
+    monkeypatch.setattr(lsc_measurements, "CACHE_SIZE", 2)
+    calls = count_parses(monkeypatch)
+    filenames = [lsc_file]
+    for i in range(2):
+        filenames.append(str(tmpdir / f"copy_{i}.csv"))
+        shutil.copy(lsc_file, filenames[-1])
+
+    for filename in filenames[:2] + filenames[:1] + filenames[2:] + filenames[:2]:
+        LSCFileReader(filename, labels_column="SMPL_ID").read_file()
+
+    # the second file is evicted by the third one, the first one is not
+    assert calls == filenames + filenames[1:2]
+
+
+def test_read_file_disk_cache(tmpdir, lsc_file, monkeypatch):
+    pytest.importorskip("pyarrow")
+    calls = count_parses(monkeypatch)
+    cache_dir = str(tmpdir / "cache")
+
+    first = LSCFileReader(lsc_file, labels_column="SMPL_ID", cache_dir=cache_dir)
+    first.read_file()
+    lsc_measurements.clear_cache()
+    second = LSCFileReader(lsc_file, labels_column="SMPL_ID", cache_dir=cache_dir)
+    second.read_file()
+
+    assert len(calls) == 1
+    pd.testing.assert_frame_equal(first.data, second.data)
+    assert second.header_content == first.header_content
+    assert second.quench_set == first.quench_set
+
+
+def test_read_file_disk_cache_without_pyarrow(tmpdir, lsc_file, monkeypatch):
+    monkeypatch.setattr(lsc_measurements.importlib.util, "find_spec", lambda _: None)
+    reader = LSCFileReader(
+        lsc_file, labels_column="SMPL_ID", cache_dir=str(tmpdir / "cache")
+    )
+
+    with pytest.raises(ImportError, match="pyarrow"):
+        reader.read_file()
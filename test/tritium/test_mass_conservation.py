@@ -3,8 +3,9 @@ import numpy as np
 import pytest
 
 
+@pytest.mark.parametrize("solver", ["BDF", "analytic"])
 @pytest.mark.parametrize("TBR", [0, 1e-2, 0.5, 1, 2])
-def test_simple_case(TBR):
+def test_simple_case(TBR, solver):
     # build
     model = Model(
         radius=2 * ureg.m,
@@ -17,7 +18,7 @@ def test_simple_case(TBR):
     )
 
     # run
-    model.run(100 * ureg.s)
+    model.run(100 * ureg.s, solver=solver)
 
     # test
     neutron_fluence = (
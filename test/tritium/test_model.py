@@ -0,0 +1,485 @@
+import copy
+import libra_toolbox.tritium.model as model_module
+from libra_toolbox.tritium.model import Model, ModelBatch, ureg
+import numpy as np
+import pytest
+
+
+def make_model(TBR=0.5, k_top=2, k_wall=3):
+    return Model(
+        radius=2 * ureg.m,
+        height=4 * ureg.m,
+        TBR=TBR * ureg.particle * ureg.neutron**-1,
+        k_top=k_top * ureg.m * ureg.s**-1,
+        k_wall=k_wall * ureg.m * ureg.s**-1,
+        irradiations=[(0 * ureg.s, 10 * ureg.s), (60 * ureg.s, 70 * ureg.s)],
+        neutron_rate=30 * ureg.neutron * ureg.s**-1,
+    )
+
+
+@pytest.mark.parametrize("TBR", [0, 1e-2, 0.5, 1, 2])
+def test_analytic_solver_matches_bdf(TBR):
+    """Checks that the analytic solver gives the same results as the BDF solver"""
+    # build
+    model_bdf = make_model(TBR=TBR)
+    model_analytic = make_model(TBR=TBR)
+
+    # run
+    model_bdf.run(100 * ureg.s)
+    model_analytic.run(100 * ureg.s, solver="analytic")
+
+    # test
+    assert model_analytic.times.units == model_bdf.times.units
+    assert model_analytic.concentrations.units == model_bdf.concentrations.units
+    assert np.allclose(model_analytic.times, model_bdf.times)
+    scale = max(model_bdf.concentrations.magnitude.max(), 1e-30)
+    assert np.allclose(
+        model_analytic.concentrations.magnitude / scale,
+        model_bdf.concentrations.magnitude / scale,
+        atol=1e-2,
+    )
+
+
+@pytest.mark.parametrize("k", [0, 1e-12, 1e-6])
+def test_analytic_solver_without_release(k):
+    """Checks the analytic solver when the conductance is zero or vanishing,
+    where the tritium accumulates in the salt"""
+    model_bdf = make_model(k_top=k, k_wall=k)
+    model_analytic = make_model(k_top=k, k_wall=k)
+
+    model_bdf.run(100 * ureg.s)
+    model_analytic.run(100 * ureg.s, solver="analytic")
+
+    assert np.all(np.isfinite(model_analytic.concentrations.magnitude))
+    assert np.allclose(
+        model_analytic.concentrations.magnitude,
+        model_bdf.concentrations.magnitude,
+        rtol=1e-5,
+    )
+    # all the produced tritium is in the salt
+    produced = 2 * 10 * ureg.s * model_analytic.TBR * model_analytic.neutron_rate
+    assert np.isclose(
+        model_analytic.concentrations[-1] * model_analytic.volume,
+        produced.to(ureg.particle),
+        rtol=1e-3,
+    )
+
+
+def test_piecewise_exponential_integral_without_release():
+    """Checks the integral of the exact solution for a vanishing conductance
+    against a numerical integration"""
+    t_starts = np.array([0.0, 10.0, 60.0])
+    t_stops = np.array([10.0, 60.0, 100.0])
+    sources = np.array([3.0, 0.0, 2.0])
+    times = np.linspace(0, 100, 20001)
+    interval_index = model_module._find_intervals(times, t_stops)
+
+    for conductance in [0.0, 1e-12, 1e-2]:
+        args = (times, interval_index, t_starts, t_stops, sources, 2.0, conductance)
+        concentrations = model_module._piecewise_exponential(*args)
+        integral = model_module._piecewise_exponential_integral(*args)
+        expected = np.concatenate(
+            [
+                [0],
+                np.cumsum(
+                    np.diff(times) * (concentrations[1:] + concentrations[:-1]) / 2
+                ),
+            ]
+        )
+        assert np.all(np.isfinite(integral))
+        assert np.allclose(integral, expected, rtol=1e-6, atol=1e-9)
+
+
+def test_analytic_solver_steady_state():
+    """Checks that the analytic solution reaches the steady state concentration
+    during a long irradiation"""
+    model = make_model()
+    model.irradiations = [(0 * ureg.s, 1e3 * ureg.s)]
+
+    model.run(2e3 * ureg.s, solver="analytic")
+
+    expected = (
+        model.TBR
+        * model.neutron_rate
+        / (model.A_top * model.k_top + model.A_wall * model.k_wall)
+    )
+    idx = np.argmin(np.abs(model.times - 1e3 * ureg.s))
+    assert np.isclose(
+        model.concentrations[idx], expected.to(model.concentrations.units)
+    )
+
+
+@pytest.mark.parametrize("solver", ["BDF", "Radau", "LSODA", "RK45"])
+def test_compiled_rhs_matches_rhs(solver):
+    """Checks that the unit-free right-hand side gives the same results as
+    ``Model.rhs``"""
+    model_compiled = make_model()
+    model_pint = make_model()
+
+    model_compiled.run(100 * ureg.s, solver=solver)
+    model_pint.run(100 * ureg.s, solver=solver, compiled=False)
+
+    scale = model_pint.concentrations.magnitude.max()
+    assert np.allclose(model_compiled.times, model_pint.times)
+    assert np.allclose(
+        model_compiled.concentrations.magnitude / scale,
+        model_pint.concentrations.magnitude / scale,
+        atol=1e-2,
+    )
+
+
+@pytest.mark.parametrize("solver", ["analytic", "BDF"])
+def test_model_batch_matches_models(solver):
+    """Checks that each model of a ModelBatch gives the same results as the
+    equivalent Model"""
+    TBR = np.array([0.1, 0.5, 1.0])
+    k_top = np.array([1.0, 2.0, 3.0])
+    k_wall = np.array([3.0, 0.5, 1.0])
+
+    batch = ModelBatch(
+        radius=2 * ureg.m,
+        height=4 * ureg.m,
+        TBR=TBR * ureg.particle * ureg.neutron**-1,
+        k_top=k_top * ureg.m * ureg.s**-1,
+        k_wall=k_wall * ureg.m * ureg.s**-1,
+        irradiations=[(0 * ureg.s, 10 * ureg.s), (60 * ureg.s, 70 * ureg.s)],
+        neutron_rate=30 * ureg.neutron * ureg.s**-1,
+    )
+    batch.run(100 * ureg.s, solver=solver)
+
+    assert batch.concentrations.shape == (3, len(batch.times))
+    assert batch.integrated_release_top().shape == (3, len(batch.times))
+    assert batch.integrated_release_wall().shape == (3, len(batch.times))
+
+    for i in range(len(batch)):
+        model = make_model(TBR=TBR[i], k_top=k_top[i], k_wall=k_wall[i])
+        model.run(100 * ureg.s, solver="analytic")
+
+        scale = model.concentrations.magnitude.max()
+        assert np.allclose(batch.times, model.times)
+        assert np.allclose(
+            batch.concentrations[i].magnitude / scale,
+            model.concentrations.magnitude / scale,
+            atol=1e-2,
+        )
+        assert np.allclose(
+            batch.integrated_release_top()[i],
+            model.integrated_release_top(),
+            rtol=1e-2,
+        )
+        assert np.allclose(
+            batch.integrated_release_wall()[i],
+            model.integrated_release_wall(),
+            rtol=1e-2,
+        )
+
+
+def test_model_batch_broadcasts_parameters():
+    """Checks that scalar and array parameters are broadcast together"""
+    k_top, k_wall = np.meshgrid([1.0, 2.0], [1.0, 2.0, 3.0])
+    batch = ModelBatch(
+        radius=2 * ureg.m,
+        height=4 * ureg.m,
+        TBR=0.5 * ureg.particle * ureg.neutron**-1,
+        k_top=k_top.ravel() * ureg.m * ureg.s**-1,
+        k_wall=k_wall.ravel() * ureg.m * ureg.s**-1,
+        irradiations=[(0 * ureg.s, 10 * ureg.s)],
+        neutron_rate=30 * ureg.neutron * ureg.s**-1,
+    )
+
+    assert len(batch) == 6
+    assert batch.TBR.shape == (6,)
+
+    batch.run(20 * ureg.s)
+    model = batch[4]
+    assert model.k_top == batch.k_top[4]
+    assert np.allclose(model.concentrations, batch.concentrations[4])
+
+
+def test_model_batch_item_not_changed_by_next_run():
+    """Checks that a model extracted from a batch keeps its results when the
+    batch is run again"""
+    batch = ModelBatch(
+        radius=2 * ureg.m,
+        height=4 * ureg.m,
+        TBR=np.array([0.5, 1.0]) * ureg.particle * ureg.neutron**-1,
+        k_top=2 * ureg.m * ureg.s**-1,
+        k_wall=3 * ureg.m * ureg.s**-1,
+        irradiations=[(0 * ureg.s, 10 * ureg.s)],
+        neutron_rate=30 * ureg.neutron * ureg.s**-1,
+    )
+    batch.run(20 * ureg.s)
+    model = batch[0]
+    times = model.times.magnitude.copy()
+    concentrations = model.concentrations.magnitude.copy()
+
+    batch.TBR = np.array([2.0, 3.0]) * ureg.particle * ureg.neutron**-1
+    batch.run(30 * ureg.s)
+
+    assert np.array_equal(model.times.magnitude, times)
+    assert np.array_equal(model.concentrations.magnitude, concentrations)
+
+
+@pytest.mark.parametrize("solver", ["analytic", "BDF"])
+def test_run_n_points(solver):
+    """Checks the number of output times per interval"""
+    model = make_model()
+    model.run(100 * ureg.s, solver=solver, n_points=10)
+
+    # 4 intervals: (0, 10), (10, 60), (60, 70), (70, 100)
+    assert len(model.times) == 40
+    assert model.concentrations.shape == model.times.shape
+
+
+@pytest.mark.parametrize("n_points", [0, 1, [5, 1, 5, 5]])
+def test_run_n_points_too_small(n_points):
+    model = make_model()
+    with pytest.raises(ValueError, match="n_points must be at least 2"):
+        model.run(100 * ureg.s, solver="analytic", n_points=n_points)
+
+
+@pytest.mark.parametrize("solver", ["analytic", "BDF"])
+def test_run_resolution(solver):
+    """Checks that the output times are at most ``resolution`` apart"""
+    model = make_model()
+    model.run(100 * ureg.s, solver=solver, resolution=2 * ureg.s)
+
+    assert np.diff(model.times.to(ureg.s).magnitude).max() <= 2 + 1e-10
+    # 6 + 26 + 6 + 16 points
+    assert len(model.times) == 54
+
+
+@pytest.mark.parametrize("solver", ["analytic", "BDF"])
+def test_run_t_eval(solver):
+    """Checks that only the requested times are stored, with the same
+    concentrations as on the default output times"""
+    reference = make_model()
+    reference.run(100 * ureg.s, solver="analytic")
+
+    t_eval = np.array([5, 10, 30, 65, 99]) * ureg.s
+    model = make_model()
+    model.run(100 * ureg.s, solver=solver, t_eval=t_eval.to(ureg.min))
+
+    expected = np.interp(
+        t_eval.magnitude,
+        reference.times.to(ureg.s).magnitude,
+        reference.concentrations.magnitude,
+    )
+    assert np.allclose(model.times, t_eval)
+    assert np.allclose(model.concentrations.magnitude, expected, rtol=1e-2)
+
+
+def test_run_t_eval_out_of_bounds():
+    model = make_model()
+    with pytest.raises(ValueError, match=r"t_eval must be between 0 and .*\(100 s\)"):
+        model.run(100 * ureg.s, t_eval=[10, 200] * ureg.s)
+    with pytest.raises(ValueError, match="t_eval must be between 0"):
+        model.run(100 * ureg.s, t_eval=[-1, 10] * ureg.s)
+
+
+@pytest.mark.parametrize("solver", ["analytic", "BDF"])
+def test_run_t_eval_duplicates_and_before_irradiation(solver):
+    """Checks repeated times and times before the first irradiation"""
+    model = make_model()
+    model.irradiations = [(20 * ureg.s, 30 * ureg.s), (60 * ureg.s, 70 * ureg.s)]
+    reference = copy.deepcopy(model)
+    reference.run(100 * ureg.s, solver="analytic", t_eval=[25, 65] * ureg.s)
+
+    t_eval = np.array([65, 5, 25, 0, 25, 5, 65]) * ureg.s
+    model.run(100 * ureg.s, solver=solver, t_eval=t_eval)
+
+    assert np.array_equal(model.times.magnitude, [0, 5, 5, 25, 25, 65, 65])
+    concentrations = model.concentrations.magnitude
+    assert np.all(concentrations[:3] == 0)
+    assert concentrations[3] == concentrations[4] > 0
+    assert concentrations[5] == concentrations[6] > 0
+    assert np.allclose(
+        concentrations[[3, 5]], reference.concentrations.magnitude, rtol=1e-3
+    )
+
+
+def test_run_adaptive():
+    """Checks that adaptive output times are denser at the start of each interval
+    and that the results match the default output times"""
+    reference = make_model(k_top=0.02, k_wall=0.03)
+    reference.run(100 * ureg.s, solver="analytic")
+
+    model = make_model(k_top=0.02, k_wall=0.03)
+    model.run(100 * ureg.s, solver="analytic", adaptive=True, n_points=50)
+
+    times = model.times.to(ureg.s).magnitude
+    assert len(times) == 200
+    assert np.allclose(
+        times[[0, 49, 50, 99, 100, 149, 150, 199]], [0, 10, 10, 60, 60, 70, 70, 100]
+    )
+    steps = np.diff(times[50:100])
+    assert steps[0] < steps[-1]
+
+    expected = np.interp(
+        times, reference.times.to(ureg.s).magnitude, reference.concentrations.magnitude
+    )
+    assert np.allclose(model.concentrations.magnitude, expected, rtol=1e-3)
+
+
+@pytest.mark.parametrize("solver", ["analytic", "BDF"])
+def test_run_reuses_result_buffers(solver):
+    """Checks that a second run stores its results in the memory of the first one"""
+    model = make_model()
+    model.run(100 * ureg.s, solver=solver)
+    times, concentrations = model.times.magnitude, model.concentrations.magnitude
+    first_concentrations = concentrations.copy()
+
+    model.k_top *= 2
+    model.reset()
+    assert model.times == []
+    model.run(100 * ureg.s, solver=solver)
+
+    assert model.times.magnitude is not times
+    assert np.shares_memory(model.times.magnitude, times)
+    assert np.shares_memory(model.concentrations.magnitude, concentrations)
+    assert not np.allclose(model.concentrations.magnitude, first_concentrations)
+
+    # fewer output times use a view on the same buffer
+    model.run(100 * ureg.s, solver=solver, n_points=10)
+    assert len(model.times) == 40
+    assert np.shares_memory(model.concentrations.magnitude, concentrations)
+
+
+def test_copied_model_has_its_own_buffers():
+    model = make_model()
+    model.run(100 * ureg.s, solver="analytic")
+    model_copy = copy.copy(model)
+    model_copy.k_top *= 2
+    model_copy.run(100 * ureg.s, solver="analytic")
+
+    assert not np.shares_memory(
+        model.concentrations.magnitude, model_copy.concentrations.magnitude
+    )
+    assert not np.allclose(model.concentrations, model_copy.concentrations)
+
+
+@pytest.mark.parametrize("solver", ["analytic", "BDF"])
+def test_incremental_run_appended_irradiation(solver, monkeypatch):
+    """Checks that an incremental run after appending an irradiation only
+    solves the new intervals and gives the same results as a full run"""
+    model = make_model()
+    model.run(100 * ureg.s, solver=solver)
+
+    model.irradiations.append((120 * ureg.s, 130 * ureg.s))
+
+    # count the intervals integrated numerically
+    calls = []
+    original_solve_ivp = model_module.solve_ivp
+
+    def counting_solve_ivp(*args, **kwargs):
+        calls.append(kwargs["t_span"])
+        return original_solve_ivp(*args, **kwargs)
+
+    monkeypatch.setattr(model_module, "solve_ivp", counting_solve_ivp)
+
+    model.run(200 * ureg.s, solver=solver, incremental=True)
+    solved_intervals = list(calls)
+
+    reference = make_model()
+    reference.irradiations.append((120 * ureg.s, 130 * ureg.s))
+    reference.run(200 * ureg.s, solver=solver)
+
+    assert np.allclose(model.times, reference.times)
+    assert np.allclose(
+        model.concentrations, reference.concentrations, rtol=1e-6, atol=1e-12
+    )
+    if solver == "BDF":
+        # (70, 120), (120, 130) and (130, 200) instead of 6 intervals
+        assert solved_intervals == [(70, 120), (120, 130), (130, 200)]
+
+
+def test_incremental_run_changed_parameters():
+    """Checks that all the intervals are solved again when a parameter changed"""
+    model = make_model()
+    model.run(100 * ureg.s, solver="analytic")
+    model.k_top = 4 * ureg.m * ureg.s**-1
+    model.run(150 * ureg.s, solver="analytic", incremental=True)
+
+    reference = make_model(k_top=4)
+    reference.run(150 * ureg.s, solver="analytic")
+
+    assert np.allclose(model.concentrations, reference.concentrations)
+
+
+def test_incremental_run_with_t_eval():
+    model = make_model()
+    with pytest.raises(ValueError, match="t_eval cannot be used with incremental"):
+        model.run(100 * ureg.s, t_eval=[10, 20] * ureg.s, incremental=True)
+
+
+@pytest.mark.parametrize("t", [0, 5, 10, 30, 60, 65, 70, 100])
+def test_source_matches_irradiations(t):
+    """Checks that the source is only on strictly within the irradiations"""
+    model = make_model()
+    expected = model.TBR * model.neutron_rate
+    on = any(start < t * ureg.s < stop for start, stop in model.irradiations)
+
+    source = model.source(t * ureg.s)
+
+    assert source.to(expected.units).magnitude == (expected.magnitude if on else 0)
+
+
+def test_source_array_of_times():
+    """Checks that the source can be evaluated at an array of times at once"""
+    model = make_model()
+    times = np.linspace(-10, 100, num=111) * ureg.s
+
+    sources = model.source(times)
+
+    expected = [model.source(t).magnitude for t in times]
+    assert sources.shape == times.shape
+    assert np.array_equal(sources.magnitude, expected)
+
+
+def test_source_unsorted_irradiations():
+    """Checks that the irradiations do not need to be sorted"""
+    model = make_model()
+    model.irradiations = [(60 * ureg.s, 70 * ureg.s), (0 * ureg.s, 10 * ureg.s)]
+
+    sources = model.source([5, 30, 65] * ureg.s)
+
+    assert np.array_equal(sources.magnitude > 0, [True, False, True])
+
+
+def test_source_follows_changed_irradiations():
+    """Checks that the compiled irradiations are updated when they change"""
+    model = make_model()
+    assert model.source(80 * ureg.s).magnitude == 0
+
+    model.irradiations.append((75 * ureg.s, 90 * ureg.s))
+    assert model.source(80 * ureg.s).magnitude > 0
+
+    model.irradiations[-1] = (85 * ureg.s, 90 * ureg.s)
+    assert model.source(80 * ureg.s).magnitude == 0
+
+
+def test_source_no_irradiations():
+    model = make_model()
+    model.irradiations = []
+
+    assert model.source(5 * ureg.s).magnitude == 0
+    assert np.array_equal(model.source([5, 65] * ureg.s).magnitude, [0, 0])
+
+
+def test_batch_source_array_of_times():
+    """Checks that the source of a batch has one row per model"""
+    batch = ModelBatch(
+        radius=2 * ureg.m,
+        height=4 * ureg.m,
+        TBR=[0.5, 1, 2] * ureg.particle * ureg.neutron**-1,
+        k_top=2 * ureg.m * ureg.s**-1,
+        k_wall=3 * ureg.m * ureg.s**-1,
+        irradiations=[(0 * ureg.s, 10 * ureg.s)],
+        neutron_rate=30 * ureg.neutron * ureg.s**-1,
+    )
+
+    sources = batch.source([5, 30] * ureg.s)
+
+    assert sources.shape == (3, 2)
+    assert np.allclose(sources[:, 0].magnitude, [15, 30, 60])
+    assert np.array_equal(sources[:, 1].magnitude, [0, 0, 0])
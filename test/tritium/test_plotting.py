@@ -1,6 +1,6 @@
 import pytest
 import numpy as np
-from libra_toolbox.tritium.plotting import plot_bars
+from libra_toolbox.tritium.plotting import plot_bars, replace_water
 from libra_toolbox.tritium.lsc_measurements import LIBRASample, GasStream, LSCSample
 from libra_toolbox.tritium import ureg
 
@@ -92,3 +92,63 @@ def test_plot_bars_not_stacked(sample_measurements):
     index = plot_bars(sample_measurements, stacked=False)
     assert len(index) == len(sample_measurements)
     plt.close()
+
+
+def replace_water_loop(sample_activity, time, replacement_times):
+    # reference implementation, one np.insert per replacement
+    sample_activity_changed = np.copy(sample_activity)
+    times_changed = np.copy(time)
+
+    for replacement_time in sorted(replacement_times):
+        indices = np.where(times_changed > replacement_time)
+        sample_activity_changed[indices] -= sample_activity_changed[indices][0]
+        if indices[0].size > 0:
+            first_index = indices[0][0]
+            sample_activity_changed = np.insert(
+                sample_activity_changed, first_index, np.nan * ureg.Bq
+            )
+            times_changed = np.insert(times_changed, first_index, np.nan * ureg.day)
+
+    return sample_activity_changed, times_changed
+
+
+@pytest.mark.parametrize(
+    "replacement_times",
+    [
+        [],
+        [2.5 * ureg.day],
+        [6 * ureg.h, 2.5 * ureg.day, 1 * ureg.day],
+        [1.01 * ureg.day, 1.02 * ureg.day, 3 * ureg.day],
+        [2 * ureg.day, 4 * ureg.day],
+    ],
+)
+def test_replace_water_matches_loop(replacement_times):
+    """Checks that replace_water gives the same output as the loop over replacements"""
+    times = np.linspace(0, 5, num=101) * ureg.day
+    activity = np.cumsum(np.random.default_rng(0).random(times.size)) * ureg.Bq
+
+    expected_activity, expected_times = replace_water_loop(
+        activity, times, replacement_times
+    )
+    new_activity, new_times = replace_water(activity, times, replacement_times)
+
+    assert new_activity.units == expected_activity.units
+    assert new_times.units == expected_times.units
+    assert np.allclose(
+        new_activity.magnitude, expected_activity.magnitude, equal_nan=True
+    )
+    assert np.array_equal(new_times.magnitude, expected_times.magnitude, equal_nan=True)
+
+
+def test_replace_water_after_last_time():
+    """Checks that replacements after the last time are ignored"""
+    times = np.linspace(0, 5, num=11) * ureg.day
+    activity = np.linspace(0, 10, num=11) * ureg.Bq
+
+    new_activity, new_times = replace_water(
+        activity, times, [2 * ureg.day, 5 * ureg.day, 8 * ureg.day]
+    )
+
+    assert len(new_times) == len(times) + 1
+    assert np.isnan(new_times.magnitude[5])
+    assert new_activity.magnitude[6] == 0
@@ -0,0 +1,66 @@
+from libra_toolbox.tritium.model import Model, ureg
+from libra_toolbox.tritium.scan import run_scan
+import numpy as np
+import pytest
+
+PARAMETERS = dict(
+    radius=2 * ureg.m,
+    height=4 * ureg.m,
+    TBR=0.5 * ureg.particle * ureg.neutron**-1,
+    k_top=2 * ureg.m * ureg.s**-1,
+    k_wall=3 * ureg.m * ureg.s**-1,
+    irradiations=[(0 * ureg.s, 10 * ureg.s), (60 * ureg.s, 70 * ureg.s)],
+)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_run_scan_matches_models(workers):
+    """Checks that each row of a scan matches the corresponding Model"""
+    grid = dict(
+        neutron_rate=[10, 30] * ureg.neutron * ureg.s**-1,
+        height=[4 * ureg.m, 400 * ureg.cm, 5 * ureg.m],
+    )
+
+    results = run_scan(
+        PARAMETERS, grid, t_final=100 * ureg.s, workers=workers, solver="analytic"
+    )
+
+    assert len(results) == 6
+    for _, row in results.iterrows():
+        model = Model(
+            **{
+                **PARAMETERS,
+                "neutron_rate": row["neutron_rate"],
+                "height": row["height"],
+            }
+        )
+        model.run(100 * ureg.s, solver="analytic")
+
+        assert row["times"].units == model.times.units
+        assert np.allclose(row["times"], model.times)
+        assert np.allclose(row["concentrations"], model.concentrations)
+        assert np.allclose(
+            row["integrated_release_top"], model.integrated_release_top()
+        )
+        assert np.allclose(
+            row["integrated_release_wall"], model.integrated_release_wall()
+        )
+
+
+def test_run_scan_irradiation_schedules():
+    """Checks that irradiation schedules can be scanned"""
+    grid = dict(
+        neutron_rate=[30 * ureg.neutron * ureg.s**-1],
+        irradiations=[
+            [(0 * ureg.s, 10 * ureg.s)],
+            [(0 * ureg.s, 10 * ureg.s), (60 * ureg.s, 70 * ureg.s)],
+        ],
+    )
+
+    results = run_scan(PARAMETERS, grid, t_final=100 * ureg.s, workers=2, chunksize=1)
+
+    releases = [
+        row["integrated_release_top"][-1] + row["integrated_release_wall"][-1]
+        for _, row in results.iterrows()
+    ]
+    assert np.isclose(releases[1], 2 * releases[0], rtol=1e-2)